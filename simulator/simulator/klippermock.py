@@ -1,5 +1,6 @@
 from distutils.command.config import config
 import sys
+import time
 
 from pathlib import Path # if you haven't already done so
 file = Path(__file__).resolve()
@@ -9,8 +10,22 @@ sys.path.append(str(root))
 from pathlib import Path
 from src.led_effect import ledEffect, ledFrameHandler
 
+class mockConfigError(Exception):
+    pass
+
+class mockCommandError(Exception):
+    pass
+
+class mockTimer:
+    def __init__(self, callback, waketime):
+        self.callback = callback
+        self.waketime = waketime
+
 class mockPrinter:
     NOW = 0
+    NEVER = 9999999999999999.
+    config_error = mockConfigError
+    command_error = mockCommandError
     def __init__(self, config):
         self.config = config
         self.config.set_printer(self)
@@ -49,13 +64,15 @@ class mockPrinter:
     def register_command(self, cmd, callback, desc):
         pass
     def register_timer(self, callback, time):
-        pass
+        return mockTimer(callback, time)
     def register_buttons(self, pins, callback):
         pass
     def get_reactor(self):
         return self
-    def register_timer(self, callback, time):
-        pass
+    def update_timer(self, timer, waketime):
+        timer.waketime = waketime
+    def monotonic(self):
+        return time.monotonic()
     def get_temp(self, time):
         return self.temp
     def get_kinematics(self):
@@ -81,12 +98,18 @@ class mockPrinter:
     def set_analog(self, value):
         self.led_effect.analogValue=value
     def load_template(self, config, name):
-        self.template = config.get(name)
-        return self
+        return mockTemplate(self, config.get(name))
+    def create_template_context(self):
+        return {'printer': self}
+
+class mockTemplate:
+    def __init__(self, printer, template):
+        self.printer = printer
+        self.template = template
     def render(self, context=None):
         return self.template
     def create_template_context(self):
-        return {'printer': self}
+        return self.printer.create_template_context()
 
 
 class mockConfig:
@@ -110,12 +133,12 @@ class mockConfig:
         return self.printer
     def get_object(self,o):
         return self
-    def getfloat(self,key,default,minval,maxval):
-        return float(self.config[key])
+    def getfloat(self,key,default,minval=None,maxval=None):
+        return float(self.config.get(key, default))
     def getboolean(self,key,default):
-        return bool(self.config[key])
-    def getint(self,key,default,minval,maxval):
-        return int(self.config[key])
+        return bool(self.config.get(key, default))
+    def getint(self,key,default,minval=None,maxval=None):
+        return int(self.config.get(key, default))
     def setint(self,key, value):
         self.config[key] = int (value)
     def getlist(self,key,default):
@@ -123,13 +146,35 @@ class mockConfig:
     def get_name(self):
         return "led_effect simulator"
     def get(self, key, default=None ):
-        return self.config[key]
+        return self.config.get(key, default)
+    def getchoice(self, key, choices, default=None):
+        return choices[self.config.get(key, default)]
     def set(self, key, value ):
         self.config[key]=value
 
 class mockLedHelper:
     def __init__(self,config):
         self.led_count = config.getint("ledcount", 1, 1, 1024)
+        self.led_state = [(0.0, 0.0, 0.0, 0.0)] * self.led_count
+        self.need_transmit = False
     def get_led_count(self):
         return self.led_count
+    def _check_transmit(self, print_time=None):
+        self.need_transmit = False
 
+class mockGcmd:
+    error = mockCommandError
+    def __init__(self, **params):
+        self.params = {key: str(value) for key, value in params.items()}
+    def get(self, key, default=None):
+        return self.params.get(key, default)
+    def get_float(self, key, default=None):
+        value = self.params.get(key)
+        return default if value is None else float(value)
+    def get_int(self, key, default=None):
+        value = self.params.get(key)
+        return default if value is None else int(value)
+    def get_command_parameters(self):
+        return dict(self.params)
+    def get_raw_command_parameters(self):
+        return " ".join("%s=%s" % item for item in self.params.items())
@@ -269,11 +269,12 @@ class Simulator( simgui.SimFrame ):
         if update:
             led_count = self.printer.led_helper.get_led_count()
             self.setLedCount( led_count )
+            scale = 255.0 * self.printer.led_effect.frameScale
             for led_index in range(led_count):
                 self.setLeds(led_index, 
-                    int(255.0*ledframe[led_index * 4]),
-                    int(255.0*ledframe[led_index * 4 + 1]),
-                    int(255.0*ledframe[led_index * 4 + 2]))
+                    int(scale*ledframe[led_index * 4]),
+                    int(scale*ledframe[led_index * 4 + 1]),
+                    int(scale*ledframe[led_index * 4 + 2]))
 
     def setLedCount(self, count):
         self.led_count = count
@@ -0,0 +1,92 @@
+import unittest
+
+from simulator.klippermock import mockConfig, mockPrinter
+from src.led_effect import ledCompositor, ledEffect, ledNumpyCompositor, numpy
+
+RED = (0.6, 0.0, 0.0, 0.0)
+GREEN = (0.6, 0.2, 0.0, 0.0)
+OFF = (0.0, 0.0, 0.0, 0.0)
+
+
+class TestCompositor(unittest.TestCase):
+    def build(self, compositor):
+        config = mockConfig()
+        config.setint("ledcount", 10)
+        config.set("layers", "static 0 0 top (0.6,0.0,0.0)")
+        config.set("leds", "leds:leds (1-5)")
+        self.printer = mockPrinter(config)
+        self.now = 0.0
+        self.printer.monotonic = lambda: self.now
+        self.red = self.printer.led_effect
+        self.green = self.addEffect("static 0 0 top (0.6,0.2,0.0)", "leds:leds (4-8)")
+        self.gradient = self.addEffect(
+            "gradient 1 1 top (1.0,0.0,0.0),(0.0,0.0,1.0)", "leds:leds"
+        )
+        self.printer._handle_ready()
+        self.handler = self.red.handler
+        self.handler.compositor = compositor(self.handler)
+        self.ledState = self.printer.led_helper.led_state
+
+    def addEffect(self, layers, leds):
+        config = mockConfig()
+        config.set("layers", layers)
+        config.set("leds", leds)
+        config.set_printer(self.printer)
+        effect = ledEffect(config)
+        self.printer.objects["effect %d" % len(self.printer.objects)] = effect
+        return effect
+
+    # runs the test body once for each compositor with new effects
+    def compositors(self):
+        compositors = [ledCompositor]
+        if numpy is not None:
+            compositors.append(ledNumpyCompositor)
+        for compositor in compositors:
+            with self.subTest(compositor=compositor.__name__):
+                self.build(compositor)
+                yield
+
+    def assertLedState(self, expected):
+        self.assertEqual(len(self.ledState), len(expected))
+        for led, (state, color) in enumerate(zip(self.ledState, expected)):
+            for value, expectedValue in zip(state, color):
+                self.assertAlmostEqual(value, expectedValue, 5, "LED %d" % led)
+
+    def test_overlapping_effects(self):
+        for _ in self.compositors():
+            self.gradient.set_enabled(False)
+            both = (1.0, 0.2, 0.0, 0.0)
+            self.assertLedState([RED] * 3 + [both] * 2 + [GREEN] * 3 + [OFF] * 2)
+
+    def test_stopped_effect(self):
+        for _ in self.compositors():
+            self.gradient.set_enabled(False)
+            self.green.set_enabled(False)
+            self.now = 0.5
+            self.handler.renderFrames(self.now)
+            self.assertLedState([RED] * 5 + [OFF] * 5)
+
+    def test_dense_frame(self):
+        for _ in self.compositors():
+            self.red.set_enabled(False)
+            self.green.set_enabled(False)
+            self.now = 0.5
+            self.handler.renderFrames(self.now)
+            frame = list(self.gradient.currentFrame)
+            self.assertLedState([frame[i : i + 4] for i in range(0, len(frame), 4)])
+
+    def test_fading(self):
+        for _ in self.compositors():
+            self.gradient.set_enabled(False)
+            self.green.set_enabled(False)
+            self.red.set_enabled(False)
+            self.red.set_fade_time(1.0)
+            self.red.set_enabled(True)
+            self.now = 0.5
+            self.handler.renderFrames(self.now)
+            half = (0.3, 0.0, 0.0, 0.0)
+            self.assertLedState([half] * 5 + [OFF] * 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
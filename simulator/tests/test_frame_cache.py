@@ -0,0 +1,85 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from simulator.klippermock import mockConfig, mockPrinter
+from src.led_effect import frameCache, ledEffect, tableFile
+
+GRADIENT = "gradient 1 1 top (1.0,0.0,0.0),(0.0,0.0,1.0)"
+
+
+class TestFrameCache(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path)
+
+    def build(self, layers, cachePath=None):
+        config = mockConfig()
+        config.setint("ledcount", 10)
+        config.set("layers", layers)
+        self.printer = mockPrinter(config)
+        self.printer.monotonic = lambda: 0.0
+        handler = self.printer.led_effect.handler
+        handler.frameCache = frameCache(self.printer, cachePath)
+        self.second = self.addEffect(layers)
+        self.printer._handle_ready()
+        return handler.frameCache
+
+    def addEffect(self, layers):
+        config = mockConfig()
+        config.set("layers", layers)
+        config.set_printer(self.printer)
+        effect = ledEffect(config)
+        self.printer.objects["effect %d" % len(self.printer.objects)] = effect
+        return effect
+
+    def frames(self, table):
+        return [[round(v, 5) for v in table[i]] for i in range(len(table))]
+
+    def test_table_file(self):
+        self.build(GRADIENT)
+        table = self.printer.led_effect.layers[0].thisFrame
+        path = os.path.join(self.path, "gradient.frames")
+        tableFile.save(path, table)
+        loaded = tableFile.load(path)
+        self.assertIsNot(loaded, table)
+        self.assertEqual(self.frames(loaded), self.frames(table))
+        # the values are not copied, but read from the mapped file
+        self.assertIsInstance(loaded.strip.values, memoryview)
+        self.assertTrue(loaded.strip.values.readonly)
+
+    def test_shared_tables(self):
+        cache = self.build(GRADIENT)
+        first = self.printer.led_effect.layers[0]
+        second = self.second.layers[0]
+        self.assertIs(first.thisFrame, second.thisFrame)
+        self.assertEqual(len(cache.tables), 1)
+
+        first.releaseFrames()
+        self.assertEqual(len(cache.tables), 1)
+        second.releaseFrames()
+        self.assertEqual(cache.tables, {})
+
+    def test_stored_tables(self):
+        self.build(GRADIENT, self.path)
+        table = self.printer.led_effect.layers[0].thisFrame
+        self.assertEqual(len(os.listdir(self.path)), 1)
+
+        self.build(GRADIENT, self.path)
+        loaded = self.printer.led_effect.layers[0].thisFrame
+        self.assertIsNot(loaded, table)
+        self.assertEqual(self.frames(loaded), self.frames(table))
+
+    def test_stale_tables(self):
+        for name in ["0123456789abcdef-0.frames", "0.frames.1.tmp", "notes.txt"]:
+            open(os.path.join(self.path, name), "w").close()
+        cache = self.build(GRADIENT, self.path)
+        names = sorted(os.listdir(self.path))
+        self.assertEqual(len(names), 2)
+        self.assertTrue(names[0].startswith(cache.version + "-"))
+        self.assertEqual(names[1], "notes.txt")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+
+from simulator.klippermock import mockCommandError, mockConfig, mockGcmd, mockPrinter
+from src.led_effect import ledEffect
+
+
+class TestLayerParameters(unittest.TestCase):
+    def setUp(self):
+        config = mockConfig()
+        config.setint("ledcount", 10)
+        config.set(
+            "layers",
+            "static 0 0 top (0.5,0.0,0.0)\n"
+            "heater 10 20 add (0.0,0.0,0.0),(0.0,0.0,1.0)",
+        )
+        self.printer = mockPrinter(config)
+        self.now = 0.0
+        self.printer.monotonic = lambda: self.now
+        self.printer._handle_ready()
+        self.effect = self.printer.led_effect
+        self.handler = self.effect.handler
+        self.effect.set_enabled(True)
+
+    def layer(self, index):
+        return self.effect.layers[-index]
+
+    def setLayer(self, **params):
+        self.effect.cmd_SET_LED_EFFECT(mockGcmd(**params))
+        self.now += 0.1
+        self.handler.renderFrames(self.now)
+
+    def test_live_parameters(self):
+        heater = self.layer(2)
+        self.assertIsInstance(heater, ledEffect.layerHeater)
+        self.setLayer(LAYER=2, RATE=30, CUTOFF=40)
+        self.assertIs(self.layer(2), heater)
+        self.assertEqual(heater.effectRate, 30.0)
+        self.assertEqual(heater.effectCutoff, 40.0)
+
+    def test_palette(self):
+        static = self.layer(1)
+        self.setLayer(LAYER=1, PALETTE="(0.0,0.5,0.0)")
+        self.assertIsNot(self.layer(1), static)
+        self.assertEqual(self.layer(1).paletteColors, [0.0, 0.5, 0.0, 0.0])
+        for state in self.printer.led_helper.led_state:
+            self.assertAlmostEqual(state[0], 0.0)
+            self.assertAlmostEqual(state[1], 0.5)
+
+    def test_stopped_effect(self):
+        self.setLayer(LAYER=1, PALETTE="(0.0,0.5,0.0)", STOP=1)
+        self.assertFalse(self.effect.enabled)
+        self.assertEqual(self.layer(1).paletteColors, [0.0, 0.5, 0.0, 0.0])
+
+    def test_unknown_layer(self):
+        with self.assertRaises(mockCommandError):
+            self.setLayer(LAYER=3, RATE=1)
+
+    def test_invalid_palette(self):
+        static = self.layer(1)
+        with self.assertRaises(mockCommandError):
+            self.setLayer(LAYER=1, PALETTE="(0.0,blue,0.0)")
+        self.assertIs(self.layer(1), static)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+import unittest
+
+from simulator.klippermock import mockConfig, mockPrinter
+
+
+class TestRestart(unittest.TestCase):
+    def setUp(self):
+        config = mockConfig()
+        config.setint("ledcount", 10)
+        config.set("layers", "cylon 1 0 top (1.0,0.0,0.0),(0.0,0.0,1.0)")
+        self.printer = mockPrinter(config)
+        self.now = 0.0
+        self.printer.monotonic = lambda: self.now
+        self.printer._handle_ready()
+        self.effect = self.printer.led_effect
+        self.effect.set_enabled(True)
+        self.layer = self.effect.layers[0]
+
+    def showFrames(self, count):
+        for i in range(count):
+            self.effect.getFrame(self.now)
+            self.now += self.effect.frameRate
+
+    def test_resume(self):
+        self.showFrames(12)
+        self.effect.set_enabled(False)
+        self.showFrames(3)
+        stopped = self.layer.frameNumber
+        self.now += 10.0
+        self.effect.set_enabled(True)
+        self.effect.getFrame(self.now)
+        self.assertEqual(
+            self.layer.frameNumber, (stopped + 1) % self.layer.frameCount
+        )
+
+    def test_restart(self):
+        self.showFrames(12)
+        self.effect.set_enabled(False)
+        self.now += 10.0
+        self.effect.reset_frame()
+        self.effect.set_enabled(True)
+        self.effect.getFrame(self.now)
+        self.assertEqual(self.layer.frameNumber, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+import unittest
+
+from simulator.klippermock import mockConfig, mockPrinter
+from src.led_effect import ledEffect
+
+
+class TestScheduler(unittest.TestCase):
+    def setUp(self):
+        config = mockConfig()
+        config.setint("ledcount", 10)
+        config.set("layers", "static 0 0 top (1.0,0.0,0.0)")
+        self.printer = mockPrinter(config)
+        self.now = 0.0
+        self.printer.monotonic = lambda: self.now
+        self.static = self.printer.led_effect
+        self.chase = self.addEffect("chase 1 0.5 top (0.0,1.0,0.0)", "24.0")
+        self.slow = self.addEffect("breathing 2 0 top (0.0,0.0,1.0)", "2.0")
+        self.printer._handle_ready()
+        self.handler = self.static.handler
+        self.rendered = []
+        for effect in self.handler.effects:
+            self.recordFrames(effect)
+
+    def addEffect(self, layers, frameRate):
+        config = mockConfig()
+        config.set("layers", layers)
+        config.set("frame_rate", frameRate)
+        config.set_printer(self.printer)
+        effect = ledEffect(config)
+        self.printer.objects["effect %d" % len(self.printer.objects)] = effect
+        return effect
+
+    def recordFrames(self, effect):
+        getFrame = effect.getFrame
+
+        def recordedFrame(eventtime):
+            self.rendered.append(effect)
+            return getFrame(eventtime)
+
+        effect.getFrame = recordedFrame
+
+    def renderFrames(self):
+        del self.rendered[:]
+        return self.handler.renderFrames(self.now)
+
+    def test_order(self):
+        self.renderFrames()
+        self.assertEqual(self.rendered, [self.static, self.chase, self.slow])
+
+        # effects are rendered in the order of the config, not of the schedule
+        self.slow._scheduleFrame()
+        self.chase._scheduleFrame()
+        self.renderFrames()
+        self.assertEqual(self.rendered, [self.chase, self.slow])
+
+    def test_due_effects(self):
+        self.renderFrames()
+        self.now = 0.05
+        nextEventTime = self.renderFrames()
+        self.assertEqual(self.rendered, [self.chase])
+        self.assertAlmostEqual(nextEventTime, self.chase.nextEventTime)
+
+        self.now = 0.5
+        self.renderFrames()
+        self.assertEqual(self.rendered, [self.chase, self.slow])
+
+    def test_static_effects_sleep(self):
+        self.renderFrames()
+        self.assertEqual(self.static.nextEventTime, self.printer.NEVER)
+        self.now = 0.5
+        self.renderFrames()
+        self.assertNotIn(self.static, self.rendered)
+
+    def test_parking(self):
+        self.renderFrames()
+        self.chase.set_enabled(False)
+        self.slow.set_enabled(False)
+        # disabled effects are cleared with their next frame
+        self.now = 0.5
+        self.assertEqual(self.renderFrames(), self.printer.NEVER)
+        self.assertTrue(self.handler.sleeping)
+        for poll in (
+            self.handler._pollHeater,
+            self.handler._pollStepper,
+            self.handler._pollProgress,
+        ):
+            self.assertEqual(poll(self.now), self.printer.NEVER)
+
+    def test_waking(self):
+        self.test_parking()
+        timers = [
+            self.handler.frameTimer,
+            self.handler.heaterTimer,
+            self.handler.stepperTimer,
+            self.handler.progressTimer,
+        ]
+        for timer in timers:
+            timer.waketime = self.printer.NEVER
+
+        self.static.requestFrame()
+        self.assertFalse(self.handler.sleeping)
+        for timer in timers:
+            self.assertEqual(timer.waketime, self.printer.NOW)
+        self.renderFrames()
+        self.assertEqual(self.rendered, [self.static])
+
+    def test_disabled_effects_are_not_woken(self):
+        self.test_parking()
+        self.chase.requestFrame()
+        self.assertTrue(self.handler.sleeping)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -6,13 +6,34 @@
 #
 # This file may be distributed under the terms of the GNU GPLv3 license.
 
-from math import cos, exp, pi
-from random import randint
+import hashlib
+import heapq
+import io
+import logging
+import mmap
+import multiprocessing
+import os
+import pickle
+import struct
+import traceback
+from array import array
+from itertools import chain as ichain, count, cycle, repeat
+from math import ceil, cos, exp, floor, log, pi
+from random import choices, randint, random
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 ANALOG_SAMPLE_TIME = 0.001
 ANALOG_SAMPLE_COUNT = 5
 ANALOG_REPORT_TIME = 0.05
 
+LOAD_SMOOTHING = 0.1
+LOAD_HOLD_TIME = 2.0
+MAX_LOAD_LEVEL = 3
+
 COLORS = 4
 
 ######################################################################
@@ -65,6 +86,851 @@ class colorArray(list):
     def padRight(self, v, a):
         self += v * a
 
+######################################################################
+# Frame tables of the layers, stored in compact typed buffers
+######################################################################
+
+
+# Quantizes values of 0.0 - 1.0 to the integers 0 - scale
+def quantize(values, scale):
+    return [
+        0 if v <= 0.0 else scale if v >= 1.0 else int(v * scale + 0.5) for v in values
+    ]
+
+
+# Frame of a quantized table, scales the stored integers back to 0.0 - 1.0
+class scaledFrame:
+    def __init__(self, values, scale):
+        self.values = values
+        self.unit = scale
+        self.scale = 1.0 / scale
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, i):
+        return self.values[i] * self.scale
+
+    def __iter__(self):
+        return map(self.scale.__mul__, self.values)
+
+
+# Frame, that has the same color on every LED. It indexes like a frame of
+# ledCount LEDs, but holds the color only once.
+class uniformFrame:
+    def __init__(self, color, ledCount):
+        self.color = color
+        self.ledCount = ledCount
+
+    def __len__(self):
+        return COLORS * self.ledCount
+
+    def __getitem__(self, i):
+        if not -len(self) <= i < len(self):
+            raise IndexError("frame index out of range")
+        return self.color[i % COLORS]
+
+    def __iter__(self):
+        return iter(list(self.color) * self.ledCount)
+
+
+# Frame, that lights only some LEDs. leds maps the index of each lit LED to
+# its color, all other LEDs show the background color.
+class sparseFrame:
+    def __init__(self, ledCount, leds, background=None):
+        self.ledCount = ledCount
+        self.leds = leds
+        self.background = background or [0.0] * COLORS
+
+    def __len__(self):
+        return COLORS * self.ledCount
+
+    def __getitem__(self, i):
+        if not -len(self) <= i < len(self):
+            raise IndexError("frame index out of range")
+        i %= len(self)
+        return self.leds.get(i // COLORS, self.background)[i % COLORS]
+
+    def __iter__(self):
+        frame = list(self.background) * self.ledCount
+        for index, color in self.leds.items():
+            frame[index * COLORS : (index + 1) * COLORS] = color
+        return iter(frame)
+
+
+class frameTable:
+    # typecode and the integer, that represents 1.0 (None for floats)
+    precisions = {
+        "float32": ("f", None),
+        "uint16": ("H", 65535),
+        "uint8": ("B", 255),
+    }
+
+    def __init__(self, width, precision="float32"):
+        self.typecode, self.scale = self.precisions[precision]
+        self.precision = precision
+        self.values = array(self.typecode)
+        self.width = width
+        self.frameCount = 0
+
+    def _pack(self, frame):
+        if self.scale is None:
+            return frame
+        return quantize(frame, self.scale)
+
+    def append(self, frame):
+        self.values.extend(self._pack(frame))
+        self.frameCount += 1
+
+    def __iadd__(self, frames):
+        for frame in frames:
+            self.append(frame)
+        return self
+
+    def __len__(self):
+        return self.frameCount
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self.frameCount
+        if not 0 <= i < self.frameCount:
+            raise IndexError("frame index out of range")
+        return self.view(i * self.width, self.width)
+
+    # zero-copy view of length values starting at start
+    def view(self, start, length):
+        return self.wrap(memoryview(self.values)[start : start + length])
+
+    # frame in a buffer of its own, stored like the frames of the table
+    def packed(self, frame):
+        return self.wrap(memoryview(array(self.typecode, self._pack(frame))))
+
+    # frame of the values in a buffer, stored like the values of the table
+    def wrap(self, values):
+        if self.scale is None:
+            return values
+        return scaledFrame(values, self.scale)
+
+    # frame of count values from each of the starts, stored like the frames
+    # of the table
+    def gather(self, starts, count):
+        values = array(self.typecode)
+        for start in starts:
+            values.extend(self.values[start : start + count])
+        return self.wrap(memoryview(values))
+
+    # copy of length values starting at start as floats
+    def copy(self, start, length):
+        values = self.values[start : start + length]
+        if self.scale is None:
+            return list(values)
+        return [v / self.scale for v in values]
+
+
+class stripFrames:
+    # The strip is a ring buffer of LEDs. Frame i is the window of ledCount
+    # LEDs, that starts at start + (i // repeat) * step or at offsets[i], if
+    # a list of offsets is given. With a list of positions, the LEDs of a
+    # frame are gathered from the strip at int(offset + position) instead.
+    def __init__(
+        self,
+        strip,
+        ledCount,
+        frameCount=1,
+        start=0,
+        step=0,
+        repeat=1,
+        offsets=None,
+        positions=None,
+        precision="float32",
+    ):
+        self.length = len(strip)
+        self.ledCount = ledCount
+        self.frameCount = max(0, frameCount) if offsets is None else len(offsets)
+        self.offsets = offsets
+        self.positions = positions
+        self.repeat = repeat
+        self.lastOffset = None
+        self.lastFrame = None
+
+        # shifting a colorArray by the whole strip or more leaves it unchanged
+        self.start = start if abs(start) < self.length else 0
+        self.step = step if abs(step) < self.length else 0
+
+        data = list(strip)
+        if positions is None and self.length:
+            # continue the strip, so that every window is contiguous
+            while len(data) < COLORS * (self.length + ledCount):
+                data += list(strip)
+        self.strip = frameTable(len(data), precision)
+        self.strip.append(data)
+
+        # windows of a mostly dark strip are returned as sparse frames
+        self.lit = []
+        if positions is None:
+            for position in range(self.length):
+                color = self.strip.copy(position * COLORS, COLORS)
+                if any(color):
+                    self.lit.append((position, color))
+        self.sparse = positions is None and 4 * len(self.lit) <= ledCount
+
+    def __len__(self):
+        return self.frameCount
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self.frameCount
+        if not 0 <= i < self.frameCount:
+            raise IndexError("frame index out of range")
+
+        if self.offsets is None:
+            offset = self.start + (i // self.repeat) * self.step
+        else:
+            offset = self.offsets[i]
+
+        if self.sparse:
+            leds = {}
+            for position, color in self.lit:
+                led = (position - offset) % self.length
+                while led < self.ledCount:
+                    leds[led] = color
+                    led += self.length
+            return sparseFrame(self.ledCount, leds)
+
+        if self.positions is None:
+            o = (offset % self.length) * COLORS
+            return self.strip.view(o, COLORS * self.ledCount)
+
+        if offset != self.lastOffset:
+            self.lastFrame = self.strip.gather(
+                [
+                    (int(offset + position) % self.length) * COLORS
+                    for position in self.positions
+                ],
+                COLORS,
+            )
+            self.lastOffset = offset
+        return self.lastFrame
+
+    # the last gathered frame is a view and not stored with the table
+    def __getstate__(self):
+        return dict(self.__dict__, lastOffset=None, lastFrame=None)
+
+
+# Frames rendered by render(i) on first access instead of at startup. With
+# memoize, rendered frames are packed like the frames of table and kept,
+# otherwise only the last one is kept.
+class lazyFrames:
+    def __init__(self, render, frameCount, table, memoize=True):
+        self.render = render
+        self.frameCount = max(0, frameCount)
+        self.table = table
+        self.memoize = memoize
+        self.frames = {}
+        self.lastIndex = None
+        self.lastFrame = None
+
+    def __len__(self):
+        return self.frameCount
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self.frameCount
+        if not 0 <= i < self.frameCount:
+            raise IndexError("frame index out of range")
+
+        if not self.memoize:
+            if i != self.lastIndex:
+                self.lastFrame = self.render(i)
+                self.lastIndex = i
+            return self.lastFrame
+
+        frame = self.frames.get(i)
+        if frame is None:
+            frame = self.frames[i] = self.table.packed(self.render(i))
+        return frame
+
+
+# Table of frames lighting a single LED each. Frame i lights the LED at
+# positions[i] in the color palette[colors[i]], none if it is off the strip.
+class pointFrames:
+    def __init__(self, ledCount, palette):
+        self.ledCount = ledCount
+        self.palette = [palette[i] for i in range(len(palette))]
+        self.positions = array("i")
+        self.colors = array("i")
+
+    def append(self, position, color):
+        self.positions.append(position)
+        self.colors.append(color)
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __getitem__(self, i):
+        position = self.positions[i]
+        if not 0 <= position < self.ledCount:
+            return sparseFrame(self.ledCount, {})
+        return sparseFrame(self.ledCount, {position: self.palette[self.colors[i]]})
+
+
+# Table of uniform frames, colors holds a single color per frame
+class uniformFrames:
+    def __init__(self, colors, ledCount):
+        self.colors = colors
+        self.ledCount = ledCount
+
+    def __len__(self):
+        return len(self.colors)
+
+    def __getitem__(self, i):
+        return uniformFrame(self.colors[i], self.ledCount)
+
+
+# Stands in for a table, that is still being built, and shows the same frame
+# for every frame number
+class placeholderFrames:
+    def __init__(self, frame):
+        self.frame = frame
+
+    def __len__(self):
+        return 1
+
+    def __getitem__(self, i):
+        return self.frame
+
+
+# A file of precomputed tables. The tables are pickled, but the values of
+# their typed arrays follow the pickle as they are in memory. Loading maps the
+# file and the tables read their values directly from the mapped pages, which
+# are shared by all processes using the same file.
+class tableFile:
+    magic = b"LEDFRAME"
+    header = struct.Struct("<8sQ")
+
+    @staticmethod
+    def _align(size):
+        return (size + 7) & ~7
+
+    @classmethod
+    def save(cls, path, table):
+        arrays = []
+        size = [0]
+
+        def persistent_id(obj):
+            if type(obj) is not array:
+                return None
+            arrays.append(obj)
+            offset = size[0]
+            size[0] += cls._align(len(obj) * obj.itemsize)
+            return (obj.typecode, offset, len(obj))
+
+        data = io.BytesIO()
+        pickler = pickle.Pickler(data, pickle.HIGHEST_PROTOCOL)
+        pickler.persistent_id = persistent_id
+        pickler.dump(table)
+        data = data.getvalue()
+
+        start = cls._align(cls.header.size + len(data))
+        temp = "%s.%d.tmp" % (path, os.getpid())
+        with open(temp, "wb") as f:
+            f.write(cls.header.pack(cls.magic, len(data)))
+            f.write(data)
+            f.write(b"\0" * (start - cls.header.size - len(data)))
+            for values in arrays:
+                length = len(values) * values.itemsize
+                f.write(values)
+                f.write(b"\0" * (cls._align(length) - length))
+        os.replace(temp, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            buffer = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        magic, length = cls.header.unpack(buffer[: cls.header.size])
+        if magic != cls.magic:
+            raise ValueError("%s is not a frame table file" % (path,))
+        start = cls._align(cls.header.size + length)
+
+        def persistent_load(pid):
+            typecode, offset, count = pid
+            offset += start
+            values = buffer[offset : offset + count * array(typecode).itemsize]
+            return values.cast(typecode)
+
+        data = io.BytesIO(buffer[cls.header.size : cls.header.size + length])
+        unpickler = pickle.Unpickler(data)
+        unpickler.persistent_load = persistent_load
+        return unpickler.load()
+
+
+# Tables of identical layers are built once and shared by all layers using
+# them. A table is freed, when the last layer using it has been released.
+# Tables of layers with frame_generation "background" are built in worker
+# processes, the layers show a placeholder until their table has arrived. If a
+# worker dies, its tables are built in the Klipper process instead.
+# With a path, precomputed tables are also stored there and loaded again by
+# the next start of Klipper, as long as the layer and this file are the same.
+# The file names start with the version of this file, tables of other versions
+# are deleted when the cache is created.
+class frameCache:
+    def __init__(self, reactor=None, path=None):
+        self.reactor = reactor
+        self.path = path
+        self.tables = {}
+        self.pending = {}
+        self.workers = []
+        self.buildTimer = None
+        self.version = None
+        if path is not None:
+            with open(__file__, "rb") as f:
+                self.version = hashlib.sha1(f.read()).hexdigest()[:16]
+            self._evictStale()
+
+    def acquire(self, layer):
+        key = layer.frameKey
+        entry = self.tables.get(key)
+        if entry is None:
+            table = self._loadTable(key)
+            if table is None:
+                if layer.frameGeneration == "background" and self.reactor:
+                    table = placeholderFrames(
+                        uniformFrame(layer.paletteColors[0], layer.ledCount)
+                    )
+                    self.pending[key] = layer
+                    self._wakeBuilder()
+                else:
+                    table = layer._buildFrames()
+                    self._storeTable(key, table)
+            entry = self.tables[key] = [table, []]
+        entry[1].append(layer)
+        return entry[0]
+
+    def release(self, layer):
+        key = layer.frameKey
+        entry = self.tables.get(key)
+        if entry is not None and layer in entry[1]:
+            entry[1].remove(layer)
+            if not entry[1]:
+                del self.tables[key]
+                self.pending.pop(key, None)
+                self._stopUnusedWorkers()
+
+    # stops all workers, when the frame handler is discarded
+    def close(self):
+        self.pending = {}
+        for worker in self.workers:
+            self._stopWorker(worker)
+        self.workers = []
+        if self.buildTimer is not None:
+            self.reactor.unregister_timer(self.buildTimer)
+            self.buildTimer = None
+
+    # workers, none of whose tables are used anymore, are stopped
+    def _stopUnusedWorkers(self):
+        for worker in list(self.workers):
+            if not any(key in self.tables for key, layer in worker[2]):
+                self._stopWorker(worker)
+                self.workers.remove(worker)
+
+    @staticmethod
+    def _stopWorker(worker):
+        process, conn, jobs = worker
+        process.terminate()
+        process.join()
+        conn.close()
+
+    def _wakeBuilder(self):
+        if self.buildTimer is None:
+            self.buildTimer = self.reactor.register_timer(
+                self._buildPending, self.reactor.NOW
+            )
+        elif not self.workers:
+            self.reactor.update_timer(self.buildTimer, self.reactor.NOW)
+
+    def _buildPending(self, eventtime):
+        for worker in list(self.workers):
+            process, conn, jobs = worker
+            alive = process.is_alive()
+            if alive and not conn.poll():
+                continue
+            try:
+                results = conn.recv()
+            except EOFError:
+                logging.error(
+                    "led_effect: worker building frame tables died with exit code"
+                    " %s, building its tables in the Klipper process",
+                    process.exitcode,
+                )
+                results = None
+            process.join()
+            conn.close()
+            self.workers.remove(worker)
+
+            if results is None:
+                for key, layer in jobs:
+                    self._buildInProcess(key)
+                continue
+            for key, table, error in results:
+                if error is not None:
+                    logging.error("led_effect: building frames failed\n%s", error)
+                else:
+                    self._install(key, table)
+
+        if not self.workers and self.pending:
+            self._startWorkers()
+
+        if self.workers:
+            return eventtime + 0.1
+        return self.reactor.NEVER
+
+    def _startWorkers(self):
+        jobs = list(self.pending.items())
+        self.pending = {}
+        context = multiprocessing.get_context("fork")
+        count = min(len(jobs), multiprocessing.cpu_count())
+        for i in range(count):
+            conn, childConn = context.Pipe(False)
+            process = context.Process(
+                target=self._buildWorker, args=(jobs[i::count], childConn)
+            )
+            process.daemon = True
+            process.start()
+            childConn.close()
+            self.workers.append((process, conn, jobs[i::count]))
+
+    @staticmethod
+    def _buildWorker(jobs, conn):
+        results = []
+        for key, layer in jobs:
+            # the layer is a copy in this process, build into an empty table
+            layer.thisFrame = frameTable(COLORS * layer.ledCount, layer.precision)
+            try:
+                results.append((key, layer._buildFrames(), None))
+            except Exception:
+                results.append((key, None, traceback.format_exc()))
+        conn.send(results)
+        conn.close()
+
+    def _buildInProcess(self, key):
+        entry = self.tables.get(key)
+        if entry is None:
+            return
+        layer = entry[1][0]
+        layer.thisFrame = frameTable(COLORS * layer.ledCount, layer.precision)
+        try:
+            table = layer._buildFrames()
+        except Exception:
+            logging.exception("led_effect: building frames failed")
+            layer.thisFrame = entry[0]
+            return
+        self._install(key, table)
+
+    def _install(self, key, table):
+        self._storeTable(key, table)
+        entry = self.tables.get(key)
+        if entry is None:
+            return
+        entry[0] = table
+        for layer in entry[1]:
+            layer.thisFrame = table
+            layer.frameCount = len(table)
+
+    def _tablePath(self, key):
+        name = hashlib.sha1(repr((self.version, key)).encode()).hexdigest()
+        return os.path.join(self.path, "%s-%s.frames" % (self.version, name))
+
+    # tables of other versions are never loaded again
+    def _evictStale(self):
+        try:
+            names = os.listdir(self.path)
+        except OSError:
+            return
+        for name in names:
+            if not name.endswith((".frames", ".tmp")):
+                continue
+            if name.startswith(self.version + "-"):
+                continue
+            try:
+                os.remove(os.path.join(self.path, name))
+            except OSError:
+                logging.exception("led_effect: could not delete frame table %s", name)
+
+    def _loadTable(self, key):
+        if self.path is None:
+            return None
+        path = self._tablePath(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            return tableFile.load(path)
+        except Exception:
+            logging.exception("led_effect: could not load frame table %s", path)
+            return None
+
+    # only fully precomputed tables are stored, lazy ones render on demand
+    def _storeTable(self, key, table):
+        if isinstance(table, uniformFrames):
+            if not isinstance(table.colors, frameTable):
+                return
+        elif not isinstance(table, (frameTable, stripFrames, pointFrames)):
+            return
+        if self.path is None:
+            return
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            tableFile.save(self._tablePath(key), table)
+        except Exception:
+            logging.exception("led_effect: could not store frame table")
+
+
+######################################################################
+# Fire simulation of the fire layers
+######################################################################
+
+
+# Heat of every LED between 0 and 100, that cools down randomly, rises from
+# the LEDs up to source and is ignited by the layers. The heat is mapped to
+# the colors of the gradient by a table, that is indexed by the heat as byte.
+class fireKernel:
+    def __init__(self, ledCount, source, gradient, precision):
+        self.ledCount = ledCount
+        self.source = source
+        self.heat = [0.0] * ledCount
+        self.colors = frameTable(COLORS, precision)
+        for i in range(len(gradient)):
+            self.colors.append(gradient[i])
+        self.rows = [
+            tuple(self.colors.values[i * COLORS : (i + 1) * COLORS])
+            for i in range(len(gradient))
+        ]
+
+    def cool(self, cooling):
+        heat = self.heat
+        cooling = choices(range(int(cooling) + 1), k=self.ledCount)
+        heat[:] = [h - c if h >= c else h for h, c in zip(heat, cooling)]
+
+    # LEDs above source take the average heat of the three LEDs below them.
+    # Like the loop this replaces, the LED above the second one wraps around
+    # to the already diffused last LED.
+    def diffuse(self):
+        heat = self.heat
+        first = max(self.source + 1, 3)
+        if first < self.ledCount:
+            heat[first:] = [
+                (a + b + c) / 3
+                for a, b, c in zip(
+                    heat[first - 1 : -1], heat[first - 2 : -2], heat[first - 3 : -3]
+                )
+            ]
+        if self.source + 1 < first and self.source + 1 < self.ledCount:
+            heat[2] = (heat[1] + heat[0] + heat[-1]) / 3
+
+    def ignite(self, led, amount):
+        self.heat[led] = min(self.heat[led] + amount, 100)
+
+    def frame(self):
+        values = array(
+            self.colors.typecode,
+            ichain.from_iterable(map(self.rows.__getitem__, map(int, self.heat))),
+        )
+        return self.colors.wrap(memoryview(values))
+
+
+# Keeps the heat as array and cools, diffuses and maps all LEDs at once
+class fireNumpyKernel(fireKernel):
+    def __init__(self, ledCount, source, gradient, precision):
+        super(fireNumpyKernel, self).__init__(ledCount, source, gradient, precision)
+        self.heat = numpy.zeros(ledCount)
+        self.table = numpy.array(self.rows, dtype=self.colors.typecode)
+
+    def cool(self, cooling):
+        cooling = numpy.random.randint(0, int(cooling) + 1, self.ledCount)
+        self.heat -= cooling * (self.heat >= cooling)
+
+    def diffuse(self):
+        heat = self.heat
+        first = max(self.source + 1, 3)
+        if first < self.ledCount:
+            heat[first:] = (
+                heat[first - 1 : -1] + heat[first - 2 : -2] + heat[first - 3 : -3]
+            ) / 3
+        if self.source + 1 < first and self.source + 1 < self.ledCount:
+            heat[2] = (heat[1] + heat[0] + heat[-1]) / 3
+
+    def frame(self):
+        values = self.table[self.heat.astype(numpy.uint8)]
+        return self.colors.wrap(memoryview(values.reshape(-1)))
+
+
+######################################################################
+# LED compositing, sums up the frames of all effects into the chains
+######################################################################
+
+
+# Keeps the faded and clamped colors of the last frame of every effect as
+# its contribution. Only the LEDs of updated effects are summed up again from
+# the contributions of all effects, that share them.
+class ledCompositor:
+    def __init__(self, handler):
+        self.handler = handler
+        self.contributions = {}
+        self.ownerKey = []
+        self.owners = {}
+
+    # contributions and the offset in them for every LED, built again when
+    # the effects or their LEDs change
+    def _owners(self):
+        effects = self.handler.effects
+        if len(effects) != len(self.ownerKey) or any(
+            effect is not owner or effect.leds is not leds
+            for effect, (owner, leds) in zip(effects, self.ownerKey)
+        ):
+            self.ownerKey = [(effect, effect.leds) for effect in effects]
+            self.owners = {}
+            for effect in effects:
+                size = COLORS * len(effect.leds)
+                contribution = self.contributions.get(effect)
+                if contribution is None or len(contribution) != size:
+                    contribution = self.contributions[effect] = [0.0] * size
+                for i, led in enumerate(effect.leds):
+                    self.owners.setdefault(led, []).append((contribution, i * COLORS))
+        return self.owners
+
+    def composite(self, frames):
+        owners = self._owners()
+        clamp = lambda v: 0.0 if v < 0.0 else 1.0 if v > 1.0 else v
+        touched = set()
+
+        for effect, frame in frames:
+            fade = clamp(effect.fadeValue) * effect.frameScale
+            # filled in place, the owners refer to the buffer of the effect
+            contribution = self.contributions[effect]
+            if isinstance(frame, (uniformFrame, sparseFrame)):
+                if isinstance(frame, uniformFrame):
+                    background, lit = frame.color, {}
+                else:
+                    background, lit = frame.background, frame.leds
+                for c in range(COLORS):
+                    value = clamp(background[c] * fade)
+                    contribution[c::COLORS] = repeat(value, effect.ledCount)
+                for led, color in lit.items():
+                    i = led * COLORS
+                    for c in range(COLORS):
+                        contribution[i + c] = clamp(color[c] * fade)
+            else:
+                contribution[:] = (
+                    0.0 if v < 0.0 else 1.0 if v > 1.0 else v
+                    for v in map(fade.__mul__, frame)
+                )
+            touched.update(effect.leds)
+
+        # saturated adding is associative for positive values, so the sum
+        # is clamped once, when it is written to the chain
+        for led in touched:
+            sources = owners[led]
+            if len(sources) == 1:
+                contribution, i = sources[0]
+                r, g, b, w = contribution[i : i + COLORS]
+            else:
+                r = g = b = w = 0.0
+                for contribution, i in sources:
+                    r += contribution[i]
+                    g += contribution[i + 1]
+                    b += contribution[i + 2]
+                    w += contribution[i + 3]
+            chain, index = led
+            chain.led_helper.led_state[index] = (
+                r if r < 1.0 else 1.0,
+                g if g < 1.0 else 1.0,
+                b if b < 1.0 else 1.0,
+                w if w < 1.0 else 1.0,
+            )
+
+        return {chain for chain, _ in touched}
+
+
+# Keeps the contributions as arrays and sums up the LEDs of each chain, that
+# updated effects touch, with whole-array operations
+class ledNumpyCompositor(ledCompositor):
+    # effects with the rows of their contribution and the LED indices for
+    # every chain
+    def _owners(self):
+        effects = self.handler.effects
+        if len(effects) != len(self.ownerKey) or any(
+            effect is not owner or effect.leds is not leds
+            for effect, (owner, leds) in zip(effects, self.ownerKey)
+        ):
+            self.ownerKey = [(effect, effect.leds) for effect in effects]
+            self.owners = {}
+            for effect in effects:
+                chains = {}
+                for i, (chain, index) in enumerate(effect.leds):
+                    rows, indices = chains.setdefault(chain, ([], []))
+                    rows.append(i)
+                    indices.append(index)
+                for chain, (rows, indices) in chains.items():
+                    self.owners.setdefault(chain, []).append(
+                        (effect, numpy.array(rows), numpy.array(indices))
+                    )
+        return self.owners
+
+    def composite(self, frames):
+        owners = self._owners()
+        touched = {}
+
+        for effect, frame in frames:
+            fade = min(1.0, max(0.0, effect.fadeValue)) * effect.frameScale
+            if isinstance(frame, uniformFrame):
+                color = numpy.clip(numpy.asarray(frame.color) * fade, 0.0, 1.0)
+                colors = numpy.broadcast_to(color, (effect.ledCount, COLORS))
+            elif isinstance(frame, sparseFrame):
+                colors = numpy.empty((effect.ledCount, COLORS))
+                colors[:] = frame.background
+                if frame.leds:
+                    colors[list(frame.leds)] = list(frame.leds.values())
+                colors *= fade
+                numpy.clip(colors, 0.0, 1.0, out=colors)
+            else:
+                colors = numpy.asarray(frame, dtype=float)[: COLORS * effect.ledCount]
+                colors = colors.reshape(effect.ledCount, COLORS) * fade
+                numpy.clip(colors, 0.0, 1.0, out=colors)
+            self.contributions[effect] = colors
+
+            for chain in effect.ledChains:
+                mask = touched.get(chain)
+                if mask is None:
+                    mask = touched[chain] = numpy.zeros(
+                        len(chain.led_helper.led_state), dtype=bool
+                    )
+                for owner, rows, indices in owners[chain]:
+                    if owner is effect:
+                        mask[indices] = True
+
+        for chain, mask in touched.items():
+            state = numpy.zeros((len(mask), COLORS))
+
+            # clamped once after adding, like in the plain compositor
+            for effect, rows, indices in owners[chain]:
+                contribution = self.contributions.get(effect)
+                if contribution is None:
+                    continue
+                shared = mask[indices]
+                if shared.any():
+                    numpy.add.at(state, indices[shared], contribution[rows[shared]])
+            numpy.minimum(state, 1.0, out=state)
+
+            ledState = chain.led_helper.led_state
+            if mask.all():
+                ledState[:] = map(tuple, state.tolist())
+            else:
+                mask = numpy.flatnonzero(mask)
+                for index, color in zip(mask.tolist(), state[mask].tolist()):
+                    ledState[index] = tuple(color)
+
+        return set(touched)
+
+
 ######################################################################
 # LED Effect handler
 ######################################################################
@@ -77,7 +943,32 @@ class ledFrameHandler:
         self.printer.load_object(config, "display_status")
         self.heaters = {}
         self.printProgress = 0
+        cachePath = config.get("frame_cache_path", None)
+        if cachePath is not None:
+            cachePath = os.path.expanduser(cachePath)
+        self.frameCache = frameCache(self.printer.get_reactor(), cachePath)
+        # optional tick grid, the frames of all effects are aligned to
+        frameClock = config.getfloat("frame_clock", 0.0, minval=0.0, maxval=1000.0)
+        self.clockPeriod = 1.0 / frameClock if frameClock else 0.0
+        self.clockJitter = config.getfloat(
+            "frame_clock_jitter", self.clockPeriod, minval=0.0
+        )
         self.effects = []
+        # heap of (nextEventTime, sequence, effect), entries of effects,
+        # whose nextEventTime has changed since, are dropped when they are due
+        self.schedule = []
+        self.scheduleSequence = count()
+        self.effectOrder = {}
+        # set while no effect is scheduled and all timers are parked
+        self.sleeping = False
+        # the frame rates of all effects are divided by 2**loadLevel, while
+        # the frame timer runs later than maxFrameLag
+        self.maxFrameLag = config.getfloat("max_frame_lag", 0.025, minval=0.0)
+        self.frameLag = 0.0
+        self.frameWake = None
+        self.loadLevel = 0
+        self.loadLevelTime = 0.0
+        self.frameDivider = 1
         self.stepperPositions = [0.0, 0.0, 0.0]
         self.stepperTimer = None
         self.heaterCurrent = {}
@@ -88,6 +979,9 @@ class ledFrameHandler:
         self.homing_start_flag = {}
         self.homing_end_flag = {}
         self.printer.register_event_handler("klippy:ready", self._handle_ready)
+        self.printer.register_event_handler(
+            "klippy:disconnect", self._handle_disconnect
+        )
         self.printer.register_event_handler(
             "homing:homing_move_begin", self._handle_homing_move_begin
         )
@@ -101,6 +995,10 @@ class ledFrameHandler:
             desc=self.cmd_STOP_LED_EFFECTS_help,
         )
         self.shutdown = False
+        if numpy is not None:
+            self.compositor = ledNumpyCompositor(self)
+        else:
+            self.compositor = ledCompositor(self)
 
     cmd_STOP_LED_EFFECTS_help = "Stops all led_effects"
 
@@ -137,6 +1035,9 @@ class ledFrameHandler:
         )
         self.frameTimer = self.reactor.register_timer(self._getFrames, self.reactor.NOW)
 
+    def get_status(self, eventtime):
+        return {"load_level": self.loadLevel, "frame_lag": self.frameLag}
+
     def _handle_shutdown(self):
         self.shutdown = True
         for effect in self.effects:
@@ -147,6 +1048,10 @@ class ledFrameHandler:
                     
         pass
 
+    # on restarts the handler is replaced, its workers must not outlive it
+    def _handle_disconnect(self):
+        self.frameCache.close()
+
     def _handle_homing_move_begin(self, hmove):
         endstops_being_homed = [name for es, name in hmove.endstops]
 
@@ -168,6 +1073,10 @@ class ledFrameHandler:
                 self.homing_end_flag[endstop] = 0
             self.homing[endstop] = False
 
+        for effect in self.effects:
+            if any(endstop in effect.endstops for endstop in endstops_being_homed):
+                effect.requestFrame()
+
     def addEffect(self, effect):
         if effect.heater:
             effect.heater = effect.heater.strip("\"'")
@@ -200,8 +1109,65 @@ class ledFrameHandler:
             self.effects.remove(effect)
 
         self.effects.append(effect)
+        self.effectOrder = {effect: i for i, effect in enumerate(self.effects)}
+        self.scheduleEffect(effect)
+
+    # queues the effect for its nextEventTime
+    def scheduleEffect(self, effect):
+        if effect.nextEventTime < self.reactor.NEVER:
+            heapq.heappush(
+                self.schedule,
+                (effect.nextEventTime, next(self.scheduleSequence), effect),
+            )
+            if self.sleeping:
+                self._wakeTimers()
+
+    def _wakeTimers(self):
+        self.sleeping = False
+        self.requestFrames()
+        for timer in (self.heaterTimer, self.stepperTimer, self.progressTimer):
+            if timer is not None:
+                self.reactor.update_timer(timer, self.reactor.NOW)
+
+    # runs the frame timer right away
+    def requestFrames(self):
+        self.frameWake = None
+        self.reactor.update_timer(self.frameTimer, self.reactor.NOW)
+
+    # lowers the frame rate of all effects while the frame timer fires late
+    # and restores it, once the host has recovered
+    def _governLoad(self, eventtime):
+        if self.frameWake is None or not self.maxFrameLag:
+            return
+        lag = max(0.0, eventtime - self.frameWake)
+        self.frameLag += (lag - self.frameLag) * LOAD_SMOOTHING
+        if eventtime - self.loadLevelTime < LOAD_HOLD_TIME:
+            return
+        if self.frameLag > self.maxFrameLag and self.loadLevel < MAX_LOAD_LEVEL:
+            self.loadLevel += 1
+        elif self.frameLag < self.maxFrameLag / 4 and self.loadLevel > 0:
+            self.loadLevel -= 1
+        else:
+            return
+        self.loadLevelTime = eventtime
+        self.frameDivider = 1 << self.loadLevel
+        logging.info(
+            "led_effect: frame timer %.3fs late, load level %d"
+            % (self.frameLag, self.loadLevel)
+        )
+
+    # delays the time to the next tick of the frame clock, if it is close enough
+    def alignToClock(self, eventtime):
+        if self.clockPeriod:
+            # the tolerance keeps rounding errors from skipping a whole tick
+            tick = ceil(eventtime / self.clockPeriod - 1e-6) * self.clockPeriod
+            if tick - eventtime <= self.clockJitter:
+                return tick
+        return eventtime
 
     def _pollHeater(self, eventtime):
+        if self.sleeping:
+            return self.reactor.NEVER
         for heater in self.heaters.keys():
             current, target = self.heaters[heater].get_temp(eventtime)
             self.heaterCurrent[heater] = current
@@ -211,6 +1177,8 @@ class ledFrameHandler:
         return eventtime + 0.3  # sensors get updated every 300ms
 
     def _pollStepper(self, eventtime):
+        if self.sleeping:
+            return self.reactor.NEVER
         kin_spos = {
             s.get_name(): s.get_commanded_position() for s in self.kin.get_steppers()
         }
@@ -230,63 +1198,56 @@ class ledFrameHandler:
         return eventtime + 0.5
 
     def _pollProgress(self, eventtime):
+        if self.sleeping:
+            return self.reactor.NEVER
         status = self.displayStatus.get_status(eventtime)
         p = status.get("progress")
         if p is not None:
             self.printProgress = int(p * 100)
         return eventtime + 1
 
-    def _getColorData(self, colors, fade):
-        clamp = lambda x: 0.0 if x < 0.0 else 1.0 if x > 1.0 else x
-        colors = [x * clamp(fade) for x in colors]
-        colors = colors + [0.0] * (4 - len(colors))
-        colors = colors[:4]
-        colors = [clamp(x) for x in colors]
-        return tuple(colors)
-
     def _getFrames(self, eventtime):
-        chainsToUpdate = set()
-
-        frames = [(effect, effect.getFrame(eventtime)) for effect in self.effects]
-
-        # first set all LEDs to 0, that should be updated
-        for effect, (frame, update) in frames:
-            if update:
-                for i in range(effect.ledCount):
-                    chain, index = effect.leds[i]
-                    chain.led_helper.led_state[index] = (0.0, 0.0, 0.0, 0.0)
-                    chainsToUpdate.add(chain)
-
-        # then sum up all effects for that LEDs
-        for effect, (frame, update) in frames:
-            if update:
-                for i in range(effect.ledCount):
-                    chain, index = effect.leds[i]
-
-                    current_state = list(chain.led_helper.led_state[index])
-                    effect_state = self._getColorData(
-                        frame[i * COLORS : i * COLORS + COLORS], effect.fadeValue
-                    )
-
-                    next_state = [
-                        min(1.0, a + b) for a, b in zip(current_state, effect_state)
-                    ]
+        self._governLoad(eventtime)
+        next_eventtime = self.renderFrames(eventtime)
+        if next_eventtime < self.reactor.NEVER:
+            self.frameWake = next_eventtime
+        else:
+            self.frameWake = None
+        return next_eventtime
 
-                    chain.led_helper.led_state[index] = tuple(next_state)
-                    chainsToUpdate.add(chain)
+    # renders the due effects and returns the time of the next frame. called
+    # outside of the frame timer, the timer keeps its wake time
+    def renderFrames(self, eventtime):
+        # only the effects, that are due, are asked for a frame
+        schedule = self.schedule
+        due = []
+        while schedule and schedule[0][0] <= eventtime:
+            when, _, effect = heapq.heappop(schedule)
+            if when == effect.nextEventTime and effect not in due:
+                due.append(effect)
+        due.sort(key=self.effectOrder.get)
+
+        frames = [(effect, effect.getFrame(eventtime)) for effect in due]
+        for effect in due:
+            self.scheduleEffect(effect)
+
+        chainsToUpdate = self.compositor.composite(
+            [(effect, frame) for effect, (frame, update) in frames if update]
+        )
 
         for chain in chainsToUpdate:
 
             if not self.shutdown: 
                 self._transmit_chain(chain)
-        if self.effects:
-            next_eventtime = min(
-                self.effects, key=lambda x: x.nextEventTime
-            ).nextEventTime
-        else:
-            next_eventtime = eventtime
+
+        while schedule and schedule[0][0] != schedule[0][2].nextEventTime:
+            heapq.heappop(schedule)
+        if not schedule:
+            # nothing is shown or fading, sleep until an effect is scheduled
+            self.sleeping = True
+            return self.reactor.NEVER
         # run at least with 10Hz
-        next_eventtime = min(next_eventtime, eventtime + 0.1)
+        next_eventtime = min(schedule[0][0], eventtime + 0.1)
         return next_eventtime
 
     def parse_chain(self, chain):
@@ -355,6 +1316,8 @@ class ledEffect:
     def __init__(self, config):
         self.config = config
         self.printer = config.get_printer()
+        # ADC reports can arrive before the handler gets its reactor at ready
+        self.reactor = self.printer.get_reactor()
         self.gcode = self.printer.lookup_object("gcode")
         self.gcode_macro = self.printer.load_object(config, "gcode_macro")
         self.handler = self.printer.load_object(config, "led_effect")
@@ -369,29 +1332,42 @@ class ledEffect:
         self.fadeValue = 0.0
         self.fadeTime = 0.0
         self.fadeEndTime = 0
+        self.shownFrames = []
+        self.shownFade = None
 
         # Basic functions for layering colors. t=top and b=bottom color
-        self.blendingModes = {
-            "top": (lambda t, b: t),
-            "bottom": (lambda t, b: b),
-            "add": (lambda t, b: t + b),
-            "subtract": (lambda t, b: (b - t) * (b - t > 0)),
-            "subtract_b": (lambda t, b: (t - b) * (t - b > 0)),
-            "difference": (lambda t, b: (t - b) * (t > b) + (b - t) * (t <= b)),
-            "average": (lambda t, b: 0.5 * (t + b)),
-            "multiply": (lambda t, b: t * b),
-            "divide": (lambda t, b: t / b if b > 0 else 0),
-            "divide_inv": (lambda t, b: b / t if t > 0 else 0),
-            "screen": (lambda t, b: 1.0 - (1.0 - t) * (1.0 - b)),
-            "lighten": (lambda t, b: t * (t > b) + b * (t <= b)),
-            "darken": (lambda t, b: t * (t < b) + b * (t >= b)),
+        # blending modes as expressions of the top (t) and bottom (b) value,
+        # they are inlined into the blend functions compiled for the effect
+        self.blendingExpressions = {
+            "top": "t",
+            "bottom": "b",
+            "add": "t + b",
+            "subtract": "(b - t) * (b - t > 0)",
+            "subtract_b": "(t - b) * (t - b > 0)",
+            "difference": "(t - b) * (t > b) + (b - t) * (t <= b)",
+            "average": "0.5 * (t + b)",
+            "multiply": "t * b",
+            "divide": "t / b if b > 0 else 0",
+            "divide_inv": "b / t if t > 0 else 0",
+            "screen": "1.0 - (1.0 - t) * (1.0 - b)",
+            "lighten": "t * (t > b) + b * (t <= b)",
+            "darken": "t * (t < b) + b * (t >= b)",
             "overlay": (
-                lambda t, b: 2.0 * t * b
-                if t > 0.5
-                else 1.0 - (2.0 * (1.0 - t) * (1.0 - b))
+                "2.0 * t * b if t > 0.5 else 1.0 - (2.0 * (1.0 - t) * (1.0 - b))"
             ),
         }
 
+        # blending modes, whose result does not depend on the lower layers
+        # with any frame, or with a frame that is black on every LED
+        self.opaqueModes = ["top"]
+        self.opaqueBlackModes = [
+            "multiply",
+            "divide",
+            "divide_inv",
+            "subtract_b",
+            "darken",
+        ]
+
         self.name = config.get_name().split()[1]
 
         self.autoStart = config.getboolean("autostart", False)
@@ -400,7 +1376,48 @@ class ledEffect:
         self.analogPin = config.get("analog_pin", None)
         self.buttonPins = config.getlist("button_pins", None)
         self.stepper = config.get("stepper", None)
-        self.recalculate = config.get("recalculate", False)
+        self.recalculate = config.getboolean("recalculate", False)
+        self.framePrecision = config.getchoice(
+            "frame_precision",
+            {precision: precision for precision in frameTable.precisions},
+            "float32",
+        )
+        self.frameGeneration = config.getchoice(
+            "frame_generation",
+            {mode: mode for mode in ["precompute", "background", "lazy", "memoize"]},
+            "precompute",
+        )
+        self.fixedPoint = config.getboolean("fixed_point", False)
+        self.fixedScale = frameTable.precisions[self.framePrecision][1]
+        self.frameScale = 1.0
+
+        # with fixed point, frames and blending use the integers of the
+        # frame tables, they are scaled to floats only by the compositor
+        if self.fixedPoint:
+            if self.fixedScale is None:
+                raise self.printer.config_error(
+                    "LED Effect '%s' needs a frame_precision of uint8 or "
+                    "uint16 for fixed_point" % (self.name,)
+                )
+            self.frameScale = 1.0 / self.fixedScale
+            self.blendingExpressions.update(
+                {
+                    "average": "(t + b) >> 1",
+                    "multiply": "t * b // S",
+                    "divide": "t * S // b if b > 0 else 0",
+                    "divide_inv": "b * S // t if t > 0 else 0",
+                    "screen": "S - (S - t) * (S - b) // S",
+                    "overlay": (
+                        "2 * t * b // S if 2 * t > S "
+                        "else S - 2 * (S - t) * (S - b) // S"
+                    ),
+                }
+            )
+        self.blendingModes = {
+            mode: eval("lambda t, b: " + expression, {"S": self.fixedScale})
+            for mode, expression in self.blendingExpressions.items()
+        }
+        self.blendFunctions = {}
         self.endstops = [x.strip() for x in config.get("endstops", "").split(",")]
         self.layerTempl = self.gcode_macro.load_template(config, "layers")
         self.configLayers = []
@@ -459,6 +1476,8 @@ class ledEffect:
 
         self.ledCount = len(self.leds)
         self.frame = [0.0] * COLORS * self.ledCount
+        self.uniformFrame = uniformFrame([0.0] * COLORS, self.ledCount)
+        self.currentFrame = self.frame
 
         # enumerate all effects from the subclasses of _layerBase...
         self.availableLayers = {
@@ -469,12 +1488,21 @@ class ledEffect:
         self._generateLayers()
 
     def _generateLayers(self, context=None):
+        # layers of lines, that render to the same text as before, are kept
+        oldLayers = {}
+        for layer in reversed(self.layers):
+            oldLayers.setdefault(layer.configLine, []).append(layer)
         self.layers = []
         if context is None:
             context = self.gcode_macro.create_template_context()
             context.update({"params": {}, "rawparams": ""})
         self.configLayers = self.layerTempl.render(context)
         for layer in [line for line in self.configLayers.split("\n") if line.strip()]:
+            configLine = layer.strip()
+            if oldLayers.get(configLine):
+                self.layers.insert(0, oldLayers[configLine].pop(0))
+                continue
+
             parms = [
                 parameter.strip() for parameter in layer.split() if parameter.strip()
             ]
@@ -492,33 +1520,7 @@ class ledEffect:
                 )
 
             layer = self.availableLayers[parms[0]]
-
-            pad = lambda x: x + [0.0] * (COLORS - len(x))
-            convert = lambda s: float(s)
-
-            try:
-                palette = "".join(parms[4:])  # join all elements of the list
-                palette = "".join(palette.split())  # remove whitespaces
-                palette = palette.strip(",")
-                palette = palette.split("),(")  # split colors
-                palette = [c.split(",") for c in palette]  # split color components
-                palette = [
-                    [convert(k.strip("()")) for k in c] for c in palette
-                ]  # convert to float
-                for i in palette:
-                    if len(i) > COLORS:
-                        raise Exception("Color %s has too many elements." % (str(i),))
-                palette = [pad(c) for c in palette]  # pad to COLORS colors
-                palette = [k for c in palette for k in c]  # flatten list
-            except Exception as e:
-                raise self.printer.config_error(
-                    "Error parsing palette in '%s' for layer \"%s\": %s"
-                    % (
-                        self.config.get_name(),
-                        parms[0],
-                        e,
-                    )
-                )
+            palette = self._parsePalette("".join(parms[4:]), parms[0])
             self.layers.insert(
                 0,
                 layer(
@@ -530,34 +1532,116 @@ class ledEffect:
                     frameRate=self.frameRate,
                     ledCount=len(self.leds),
                     blendingMode=parms[3],
+                    precision=self.framePrecision,
+                    frameGeneration=self.frameGeneration,
+                    configLine=configLine,
                 ),
             )
 
+        for layers in oldLayers.values():
+            for layer in layers:
+                layer.releaseFrames()
+
+        self.blendFunctions = {}
+        self._blendFunction(
+            tuple(
+                layer.blendingMode
+                for layer in self.layers
+                if layer.blendingMode != "bottom"
+            )
+        )
+
         self.handler.addEffect(self)
 
+    def _parsePalette(self, palette, layerName):
+        pad = lambda x: x + [0.0] * (COLORS - len(x))
+        convert = lambda s: float(s)
+
+        try:
+            palette = "".join(palette.split())  # remove whitespaces
+            palette = palette.strip(",")
+            palette = palette.split("),(")  # split colors
+            palette = [c.split(",") for c in palette]  # split color components
+            palette = [
+                [convert(k.strip("()")) for k in c] for c in palette
+            ]  # convert to float
+            for i in palette:
+                if len(i) > COLORS:
+                    raise Exception("Color %s has too many elements." % (str(i),))
+            palette = [pad(c) for c in palette]  # pad to COLORS colors
+            palette = [k for c in palette for k in c]  # flatten list
+        except Exception as e:
+            raise self.printer.config_error(
+                "Error parsing palette in '%s' for layer \"%s\": %s"
+                % (
+                    self.config.get_name(),
+                    layerName,
+                    e,
+                )
+            )
+        return palette
+
+    # Changes rate, cutoff or palette of a single layer, numbered from the
+    # first line of the layers. Parameters, that only nextFrame reads, are
+    # changed in place, otherwise just this layer is created again.
+    def set_layer_parameters(self, index, **parameters):
+        layer = self.layers[-index]
+        args = dict(layer.layerArgs, configLine=None)
+        args.update(parameters)
+        changed = [
+            name for name in parameters if parameters[name] != layer.layerArgs[name]
+        ]
+
+        if all(name in layer.liveParameters for name in changed):
+            for name in changed:
+                setattr(layer, name, parameters[name])
+            layer.layerArgs = args
+            layer.configLine = None
+            if self.enabled:
+                self._scheduleFrame()
+            return
+
+        newLayer = type(layer)(**args)
+        if newLayer.frameCount:
+            newLayer.frameNumber = layer.frameNumber % newLayer.frameCount
+        self.layers[-index] = newLayer
+        layer.releaseFrames()
+        if self.enabled:
+            self._scheduleFrame()
+
     def getFrame(self, eventtime):
         if not self.enabled and self.fadeValue <= 0.0:
             if self.nextEventTime < self.handler.reactor.NEVER:
                 # Effect has just been disabled. Set colors to 0 and update once.
                 self.nextEventTime = self.handler.reactor.NEVER
-                self.frame = [0.0] * COLORS * self.ledCount
+                self.currentFrame = self._clearFrame()
+                self.shownFade = None
                 update = True
             else:
                 update = False
         else:
-            update = True
+            update = False
             if eventtime >= self.nextEventTime:
-                self.nextEventTime = eventtime + self.frameRate
+                self.nextEventTime = self.handler.alignToClock(
+                    eventtime + self.frameRate * self.handler.frameDivider
+                )
 
-                self.frame = [0.0] * COLORS * self.ledCount
-                for layer in self.layers:
+                # layers are evaluated from the top, layers hidden below an
+                # opaque layer or blended as bottom only advance their frame
+                layerFrames = []
+                shownFrames = []
+                hidden = False
+                for layer in reversed(self.layers):
+                    if hidden or layer.blendingMode == "bottom":
+                        layer.skipFrame(eventtime)
+                        continue
                     layerFrame = layer.nextFrame(eventtime)
-
+                    shownFrames.append((layer, layerFrame))
+                    if layerFrame and self.fixedPoint:
+                        layerFrame = self._fixedFrame(layerFrame)
                     if layerFrame:
-                        blend = self.blendingModes[layer.blendingMode]
-                        self.frame = [
-                            blend(t, b) for t, b in zip(layerFrame, self.frame)
-                        ]
+                        layerFrames.append((layer, layerFrame))
+                        hidden = self._hidesLower(layer.blendingMode, layerFrame)
 
                 if (self.fadeEndTime > eventtime) and (self.fadeTime > 0.0):
                     remainingFade = (self.fadeEndTime - eventtime) / self.fadeTime
@@ -566,17 +1650,182 @@ class ledEffect:
 
                 self.fadeValue = 1.0 - remainingFade if self.enabled else remainingFade
 
-        return self.frame, update
+                # layers return the same frame objects as long as they do not
+                # change, the effect is then neither blended nor transmitted
+                update = (
+                    self.fadeValue != self.shownFade
+                    or len(shownFrames) != len(self.shownFrames)
+                    or any(
+                        layer is not shownLayer or layerFrame is not shownFrame
+                        for (layer, layerFrame), (shownLayer, shownFrame) in zip(
+                            shownFrames, self.shownFrames
+                        )
+                    )
+                )
+                self.shownFrames = shownFrames
+                self.shownFade = self.fadeValue
+
+                # static effects are only rendered again, when they are changed
+                if self.enabled and self.fadeValue >= 1.0:
+                    if all(layer.isStatic() for layer in self.layers):
+                        self.nextEventTime = self.handler.reactor.NEVER
+
+                if update:
+                    self.currentFrame = self._blendLayers(layerFrames)
+
+        return self.currentFrame, update
+
+    # Blends the frames of the shown layers from the bottom up
+    def _blendLayers(self, layerFrames):
+        # as long as all layers are uniform or sparse, only a
+        # background color and the lit LEDs are blended
+        color = [0 if self.fixedPoint else 0.0] * COLORS
+        leds = {}
+        frame = None
+        layerFrames.reverse()
+        for index, (layer, layerFrame) in enumerate(layerFrames):
+            if isinstance(layerFrame, uniformFrame):
+                layerColor, layerLeds = layerFrame.color, {}
+            elif isinstance(layerFrame, sparseFrame):
+                layerColor = layerFrame.background
+                layerLeds = layerFrame.leds
+            else:
+                break
+
+            blend = self.blendingModes[layer.blendingMode]
+            leds = {
+                i: [
+                    blend(t, b)
+                    for t, b in zip(
+                        layerLeds.get(i, layerColor),
+                        leds.get(i, color),
+                    )
+                ]
+                for i in set(leds).union(layerLeds)
+            }
+            color = [blend(t, b) for t, b in zip(layerColor, color)]
+        else:
+            index = len(layerFrames)
+
+        # from the first dense layer on, all frames are blended in
+        # place into the reused frame buffer
+        if index < len(layerFrames):
+            frame = self.frame
+            frame[:] = color * self.ledCount
+            for i, ledColor in leds.items():
+                frame[i * COLORS : (i + 1) * COLORS] = ledColor
+
+            layerFrames = layerFrames[index:]
+            blendFrames = self._blendFunction(
+                tuple(layer.blendingMode for layer, _ in layerFrames)
+            )
+            blendFrames(
+                frame,
+                *[
+                    (
+                        cycle(layerFrame.color)
+                        if isinstance(layerFrame, uniformFrame)
+                        else layerFrame
+                    )
+                    for _, layerFrame in layerFrames
+                ]
+            )
+
+        if frame is not None:
+            return frame
+        if leds:
+            return sparseFrame(self.ledCount, leds, color)
+        self.uniformFrame.color = color
+        return self.uniformFrame
+
+    # Function, that blends frames with the given blending modes, from the
+    # bottom up, in place into a frame. The blend expressions are inlined
+    # and the layers unrolled, it is compiled once per stack of modes.
+    def _blendFunction(self, modes):
+        blendFrames = self.blendFunctions.get(modes)
+        if blendFrames is None:
+            frames = ["frame%d" % (i,) for i in range(len(modes))]
+            values = ["t%d" % (i,) for i in range(len(modes))]
+            source = [
+                "def blendFrames(frame, %s):" % (", ".join(frames),),
+                "    for i, %s in zip(range(len(frame)), %s):"
+                % (", ".join(values), ", ".join(frames)),
+                "        b = frame[i]",
+            ]
+            for value, mode in zip(values, modes):
+                source.append("        t = %s" % (value,))
+                source.append("        b = %s" % (self.blendingExpressions[mode],))
+            source.append("        frame[i] = b")
+
+            namespace = {"S": self.fixedScale}
+            exec("\n".join(source), namespace)
+            blendFrames = self.blendFunctions[modes] = namespace["blendFrames"]
+        return blendFrames
+
+    # Frame of a layer as integers for the fixed point pipeline. Frames of
+    # tables with the same precision are used as they are stored.
+    def _fixedFrame(self, frame):
+        if isinstance(frame, uniformFrame):
+            return uniformFrame(self._fixedValues(frame.color), frame.ledCount)
+        if isinstance(frame, sparseFrame):
+            return sparseFrame(
+                frame.ledCount,
+                {led: self._fixedValues(color) for led, color in frame.leds.items()},
+                self._fixedValues(frame.background),
+            )
+        return self._fixedValues(frame)
+
+    def _fixedValues(self, values):
+        if isinstance(values, scaledFrame) and values.unit == self.fixedScale:
+            return values.values
+        return quantize(values, self.fixedScale)
+
+    # True, if the result of blending this frame is the same for any lower
+    # layers. Only uniform and sparse frames are checked for being black.
+    def _hidesLower(self, blendingMode, frame):
+        if blendingMode in self.opaqueModes:
+            return True
+        if blendingMode not in self.opaqueBlackModes:
+            return False
+        if isinstance(frame, uniformFrame):
+            return not any(frame.color)
+        if isinstance(frame, sparseFrame):
+            return not frame.leds and not any(frame.background)
+        return False
+
+    def _clearFrame(self):
+        frame = self.frame
+        for i in range(len(frame)):
+            frame[i] = 0.0
+        return frame
 
     def set_enabled(self, state):
         if self.enabled != state:
             self.enabled = state
-            self.nextEventTime = self.handler.reactor.NOW
-            self.handler._getFrames(self.handler.reactor.NOW)
+            # the layers continue after their last frame, not by the time
+            # the effect was stopped
+            for layer in self.layers:
+                layer.startTime = None
+                layer.lastStepTime = None
+            self._scheduleFrame()
+            self.handler.renderFrames(self.handler.reactor.monotonic())
+
+    # renders the effect again with the next frame of the handler
+    def _scheduleFrame(self):
+        self.nextEventTime = self.handler.reactor.NOW
+        self.handler.scheduleEffect(self)
+
+    # renders the effect right away, if it is enabled. inputs like buttons
+    # do not have to wait for the next frame of the effect
+    def requestFrame(self):
+        if self.enabled:
+            self._scheduleFrame()
+            self.handler.requestFrames()
 
     def reset_frame(self):
         for layer in self.layers:
             layer.frameNumber = 0
+            layer.startTime = None
 
     def set_fade_time(self, fadetime):
         self.fadeTime = fadetime
@@ -592,6 +1841,26 @@ class ledEffect:
         params = gcmd.get_command_parameters()
         rawparams = gcmd.get_raw_command_parameters()
 
+        index = gcmd.get_int("LAYER", None)
+        parameters = {}
+        if index is not None:
+            if not 1 <= index <= len(self.layers):
+                raise gcmd.error("LED Effect '%s' has no layer %d" % (self.name, index))
+            rate = gcmd.get_float("RATE", None)
+            if rate is not None:
+                parameters["effectRate"] = rate
+            cutoff = gcmd.get_float("CUTOFF", None)
+            if cutoff is not None:
+                parameters["effectCutoff"] = cutoff
+            palette = gcmd.get("PALETTE", None)
+            if palette is not None:
+                try:
+                    parameters["paletteColors"] = self._parsePalette(
+                        palette, "%d" % (index,)
+                    )
+                except Exception as e:
+                    raise gcmd.error(str(e))
+
         self.set_led_effect(
             fadetime=fadetime,
             stop=stop,
@@ -599,6 +1868,8 @@ class ledEffect:
             restart=restart,
             params=params,
             rawparams=rawparams,
+            layer=index,
+            layerParameters=parameters,
         )
 
     def set_led_effect(
@@ -609,8 +1880,12 @@ class ledEffect:
         restart=False,
         params=None,
         rawparams=None,
+        layer=None,
+        layerParameters=None,
     ):
         if stop:
+            if layer is not None:
+                self._changeLayer(layer, layerParameters)
             if self.enabled:
                 self.set_fade_time(fadetime)
             self.set_enabled(False)
@@ -620,6 +1895,12 @@ class ledEffect:
                 kwargs["params"] = params
                 kwargs["rawparams"] = rawparams
                 self._generateLayers(kwargs)
+                if self.enabled:
+                    self._scheduleFrame()
+            # the recalculation creates the layers from the template again,
+            # changes of a layer are applied after it
+            if layer is not None:
+                self._changeLayer(layer, layerParameters)
             if replace:
                 for led in self.leds:
                     for effect in self.handler.effects:
@@ -634,6 +1915,13 @@ class ledEffect:
                 self.reset_frame()
             self.set_enabled(True)
     
+    # changes of layers by SET_LED_EFFECT are G-Code errors, not config errors
+    def _changeLayer(self, index, parameters):
+        try:
+            self.set_layer_parameters(index, **parameters)
+        except Exception as e:
+            raise self.printer.command_error(str(e))
+
     def get_status(self, eventtime):
         return {'enabled':self.enabled}
 
@@ -641,10 +1929,24 @@ class ledEffect:
         self.set_enabled(self.runOnShutown)
 
     def adcCallback(self, read_time, read_value):
-        self.analogValue = int(read_value * 1000.0) / 10.0
+        analogValue = int(read_value * 1000.0) / 10.0
+        previous, self.analogValue = self.analogValue, analogValue
+        # a frame is only needed when an analog layer shows another frame
+        changed = any(
+            layer.frameIndex(analogValue) != layer.frameIndex(previous)
+            for layer in self.layers
+            if isinstance(layer, ledEffect.layerAnalogPin)
+        )
+        if changed:
+            # ADC values arrive in the serial thread, the reactor has to
+            # schedule the frame
+            self.reactor.register_async_callback(lambda eventtime: self.requestFrame())
 
     def button_callback(self, eventtime, state):
+        changed = state != self.button_state
         self.button_state = state
+        if changed:
+            self.requestFrame()
 
     ######################################################################
     # LED Effect layers
@@ -654,6 +1956,10 @@ class ledEffect:
     # inherit this and return 1 frame of [r, g, b] * <number of leds>
     # per call of nextFrame()
     class _layerBase(object):
+        # parameters, that are only read by nextFrame and can be changed
+        # without creating the layer again
+        liveParameters = ()
+
         def __init__(self, **kwargs):
             self.handler = kwargs["handler"]
             self.frameHandler = kwargs["frameHandler"]
@@ -663,19 +1969,134 @@ class ledEffect:
             self.effectCutoff = kwargs["effectCutoff"]
             self.frameRate = kwargs["frameRate"]
             self.blendingMode = kwargs["blendingMode"]
+            self.precision = kwargs["precision"]
+            self.frameGeneration = kwargs["frameGeneration"]
+            self.configLine = kwargs.get("configLine")
+            self.layerArgs = kwargs
+            self.frameKey = (
+                type(self).__name__,
+                self.effectRate,
+                self.effectCutoff,
+                tuple(kwargs["paletteColors"]),
+                self.ledCount,
+                self.frameRate,
+                self.precision,
+                self.frameGeneration,
+            )
+            self.sharesFrames = False
             self.frameNumber = 0
-            self.thisFrame = []
+            self.startTime = None
+            self.lastStepTime = None
+            self.stepCarry = 0.0
+            self.thisFrame = frameTable(COLORS * self.ledCount, self.precision)
             self.frameCount = 1
             self.lastAnalog = 0
+            self.lastTable = None
+            self.lastIndex = None
+            self.lastFrame = None
+            self.lastUniform = None
 
         def nextFrame(self, eventtime):
             if not self.frameCount:
                 return [0] * COLORS * self.ledCount
-            self.frameNumber += 1
-            self.frameNumber = self.frameNumber * (self.frameNumber < self.frameCount)
+            self._advanceFrame(eventtime)
+
+            return self._frameAt(self.frameNumber)
+
+        # Advances the animation of a layer, whose frame is not shown. Layers
+        # with their own nextFrame may keep state in it and still render.
+        def skipFrame(self, eventtime):
+            if type(self).nextFrame is not ledEffect._layerBase.nextFrame:
+                self.nextFrame(eventtime)
+            elif self.frameCount:
+                self._advanceFrame(eventtime)
+
+        # Frame at index of the table. The same frame is returned as the same
+        # object, so that effects can tell unchanged layers by identity.
+        def _frameAt(self, index):
+            if index != self.lastIndex or self.thisFrame is not self.lastTable:
+                self.lastTable = self.thisFrame
+                self.lastIndex = index
+                self.lastFrame = self.thisFrame[index]
+            return self.lastFrame
+
+        # uniform frame of color, the same object as long as color is equal
+        def _uniformFrame(self, color):
+            if self.lastUniform is None or self.lastUniform.color != color:
+                self.lastUniform = uniformFrame(color, self.ledCount)
+            return self.lastUniform
+
+        # True, if the layer shows the same frame until it is changed
+        def isStatic(self):
+            return (
+                type(self).nextFrame is ledEffect._layerBase.nextFrame
+                and self.frameCount <= 1
+                and not isinstance(self.thisFrame, placeholderFrames)
+            )
+
+        # The frame number is counted by time since the first frame, which
+        # is the one after frameNumber. Frames, that are due while Klipper
+        # is busy, are skipped and the animation keeps its speed.
+        def _advanceFrame(self, eventtime):
+            if self.startTime is None:
+                self.startTime = eventtime - (self.frameNumber + 1) * self.frameRate
+            frame = int((eventtime - self.startTime) / self.frameRate + 0.5)
+            self.frameNumber = frame % self.frameCount
             self.lastFrameTime = eventtime
 
-            return self.thisFrame[self.frameNumber]
+        # Time since the last call. Layers, which change their state on each
+        # call, step by it to keep their speed, when the frame rate is
+        # lowered under load or a frame is shown early for an input.
+        def _elapsedTime(self, eventtime):
+            lastStepTime = self.lastStepTime
+            self.lastStepTime = eventtime
+            if lastStepTime is None:
+                return self.frameRate
+            return eventtime - lastStepTime
+
+        # The elapsed time in whole frames, the rest is carried over to the
+        # next call
+        def _elapsedFrames(self, eventtime):
+            self.stepCarry += self._elapsedTime(eventtime) / self.frameRate
+            frames = int(self.stepCarry + 0.5)
+            self.stepCarry -= frames
+            return frames
+
+        # Takes the table from the cache of the frame handler, it is only
+        # built, if no other layer with the same parameters exists yet
+        def _shareFrames(self):
+            self.thisFrame = self.frameHandler.frameCache.acquire(self)
+            self.frameCount = len(self.thisFrame)
+            self.sharesFrames = True
+
+        def releaseFrames(self):
+            if self.sharesFrames:
+                self.frameHandler.frameCache.release(self)
+                self.sharesFrames = False
+
+        # Frames given by render(i), either precomputed or rendered on demand.
+        # Uniform frames are rendered and stored as a single color.
+        def _renderFrames(self, render, frameCount, uniform=False):
+            if uniform:
+                table = frameTable(COLORS, self.precision)
+            else:
+                table = self.thisFrame
+
+            if self.frameGeneration in ["precompute", "background"]:
+                for i in range(frameCount):
+                    table.append(render(i))
+                frames = table
+            else:
+                frames = lazyFrames(
+                    render,
+                    frameCount,
+                    table,
+                    memoize=self.frameGeneration == "memoize",
+                )
+
+            if uniform:
+                return uniformFrames(frames, self.ledCount)
+            return frames
 
         def _decayTable(self, factor=1, rate=1):
             frame = []
@@ -736,21 +2157,32 @@ class ledEffect:
         def __init__(self, **kwargs):
             super(ledEffect.layerStatic, self).__init__(**kwargs)
 
+            self._shareFrames()
+
+        def _buildFrames(self):
             self.paletteColors = colorArray(COLORS, self.paletteColors)
 
+            if len(self.paletteColors) == 1:
+                color = self.paletteColors[0]
+                return self._renderFrames(lambda frame: color, 1, uniform=True)
+
             gradientLength = int(self.ledCount)
             gradient = colorArray(
                 COLORS, self._gradient(self.paletteColors, gradientLength)
             )
 
             self.thisFrame.append(gradient[0 : self.ledCount])
-            self.frameCount = len(self.thisFrame)
+
+            return self.thisFrame
 
     # Slow pulsing of color
     class layerBreathing(_layerBase):
         def __init__(self, **kwargs):
             super(ledEffect.layerBreathing, self).__init__(**kwargs)
 
+            self._shareFrames()
+
+        def _buildFrames(self):
             brightness = []
 
             p = (1 / self.frameRate) * (self.effectRate * 0.5)
@@ -771,18 +2203,22 @@ class ledEffect:
 
                 brightness.append(v)
 
-            for c in range(0, len(self.paletteColors)):
-                color = self.paletteColors[c]
+            palette = self.paletteColors
+            steps = len(brightness)
 
-                for b in brightness:
-                    self.thisFrame += [[b * i for i in color] * self.ledCount]
+            def render(frame):
+                b = brightness[frame % steps]
+                return [b * i for i in palette[frame // steps]]
 
-            self.frameCount = len(self.thisFrame)
+            return self._renderFrames(render, len(palette) * steps, uniform=True)
 
     class layerLinearFade(_layerBase):
         def __init__(self, **kwargs):
             super(ledEffect.layerLinearFade, self).__init__(**kwargs)
 
+            self._shareFrames()
+
+        def _buildFrames(self):
             gradientLength = int(self.effectRate / self.frameRate)
             if gradientLength == 0:
                 gradientLength = 1
@@ -791,87 +2227,122 @@ class ledEffect:
                 COLORS, self._gradient(self.paletteColors, gradientLength, toFirst=True)
             )
 
-            for i in range(gradientLength):
-                self.thisFrame.append(gradient[i] * self.ledCount)
-
-            self.frameCount = len(self.thisFrame)
+            return self._renderFrames(
+                lambda frame: gradient[frame], gradientLength, uniform=True
+            )
 
     # Turns the entire strip on and off
     class layerBlink(_layerBase):
         def __init__(self, **kwargs):
             super(ledEffect.layerBlink, self).__init__(**kwargs)
 
+            self._shareFrames()
+
+        def _buildFrames(self):
             dutyCycle = max(0, min(1.0, self.effectCutoff))
             frameCountOn = int((1.0 / self.frameRate) * self.effectRate * dutyCycle)
             frameCountOff = int(
                 (1.0 / self.frameRate) * self.effectRate * (1 - dutyCycle)
             )
 
-            for c in range(0, len(self.paletteColors)):
-                color = self.paletteColors[c]
-                self.thisFrame += [color * self.ledCount] * frameCountOn
-                self.thisFrame += [[0] * COLORS * self.ledCount] * frameCountOff
+            palette = self.paletteColors
+            period = frameCountOn + frameCountOff
 
-            self.frameCount = len(self.thisFrame)
+            def render(frame):
+                if frame % period < frameCountOn:
+                    return palette[frame // period]
+                return [0] * COLORS
+
+            return self._renderFrames(render, len(palette) * period, uniform=True)
 
     # Random flashes with decay
     class layerTwinkle(_layerBase):
+        liveParameters = ("effectRate",)
+
         def __init__(self, **kwargs):
             super(ledEffect.layerTwinkle, self).__init__(**kwargs)
 
-            self.thisFrame = colorArray(COLORS, ([0.0] * COLORS) * self.ledCount)
-            self.lastBrightness = [-1] * self.ledCount
+            # only the decaying LEDs are kept, with their step in the decay
+            # table and their color
+            self.lastBrightness = {}
+            self.leds = {}
             self.decayTable = self._decayTable(factor=1 / self.effectCutoff)
             self.decayLen = len(self.decayTable)
             self.colorCount = len(self.paletteColors) - 1
+            self.lastSparse = None
+
+        # Each LED sparks with a chance of (effectRate + 1) / 256 per frame.
+        # The gaps between sparking LEDs are geometrically distributed, so
+        # one random number is drawn per spark instead of one per LED.
+        def _sparks(self):
+            chance = min(max(255 - floor(254 - self.effectRate), 0), 256) / 256.0
+            if chance >= 1.0:
+                return range(self.ledCount)
+
+            sparks = []
+            if chance > 0.0:
+                skip = log(1.0 - chance)
+                led = int(log(1.0 - random()) / skip)
+                while led < self.ledCount:
+                    sparks.append(led)
+                    led += 1 + int(log(1.0 - random()) / skip)
+            return sparks
 
         def nextFrame(self, eventtime):
-            for i in range(0, self.ledCount):
-                r = randint(0, self.colorCount)
-                color = self.paletteColors[r]
-
-                if randint(0, 255) > 254 - self.effectRate:
-                    self.lastBrightness[i] = 0
-                    self.thisFrame[i] = color
-
-                if self.lastBrightness[i] != -1:
-                    if self.lastBrightness[i] == self.decayLen:
-                        self.lastBrightness[i] = -1
-                        self.thisFrame[i] = [0.0] * COLORS
+            frames = self._elapsedFrames(eventtime)
+            if not frames and self.lastSparse is not None:
+                return self.lastSparse
+
+            # after a long stall, one second of simulation is enough
+            for _ in range(min(frames, int(1.0 / self.frameRate))):
+                sparks = self._sparks()
+                colors = choices(range(self.colorCount + 1), k=len(sparks))
+                for led, color in zip(sparks, colors):
+                    self.lastBrightness[led] = 0
+                    self.leds[led] = self.paletteColors[color]
+
+                for led, x in list(self.lastBrightness.items()):
+                    if x == self.decayLen:
+                        del self.lastBrightness[led]
+                        del self.leds[led]
                     else:
-                        x = self.lastBrightness[i]
-                        self.lastBrightness[i] += 1
-                        self.thisFrame[i] = [
-                            self.decayTable[x] * l for l in self.thisFrame[i]
+                        self.lastBrightness[led] = x + 1
+                        self.leds[led] = [
+                            self.decayTable[x] * l for l in self.leds[led]
                         ]
 
-            return self.thisFrame
+            self.lastSparse = sparseFrame(self.ledCount, self.leds)
+            return self.lastSparse
 
     # Blinking with decay
     class layerStrobe(_layerBase):
         def __init__(self, **kwargs):
             super(ledEffect.layerStrobe, self).__init__(**kwargs)
 
+            if self.effectCutoff == 0:
+                self.effectCutoff = 0.001
+
+            self._shareFrames()
+
+        def _buildFrames(self):
             frameRate = int(1.0 / self.frameRate)
             if self.effectRate == 0:
                 frameCount = 1
             else:
                 frameCount = max(1, int(frameRate / self.effectRate))
-            if self.effectCutoff == 0:
-                self.effectCutoff = 0.001
             decayTable = self._decayTable(factor=1 / self.effectCutoff, rate=1)
             if len(decayTable) > frameCount:
                 decayTable = decayTable[:frameCount]
             else:
                 decayTable += [0.0] * (frameCount - len(decayTable))
 
-            for c in range(0, len(self.paletteColors)):
-                color = self.paletteColors[c]
+            palette = self.paletteColors
 
-                for b in decayTable:
-                    self.thisFrame += [[b * i for i in color] * self.ledCount]
+            def render(frame):
+                b = decayTable[frame % frameCount]
+                return [b * i for i in palette[frame // frameCount]]
 
-            self.frameCount = len(self.thisFrame)
+            return self._renderFrames(render, len(palette) * frameCount, uniform=True)
 
     # Lights move sequentially with decay
     class layerComet(_layerBase):
@@ -886,6 +2357,9 @@ class ledEffect:
             if self.effectCutoff <= 0:
                 self.effectCutoff = 0.1
 
+            self._shareFrames()
+
+        def _buildFrames(self):
             decayTable = self._decayTable(
                 factor=len(self.paletteColors) * self.effectCutoff, rate=1
             )
@@ -910,18 +2384,24 @@ class ledEffect:
                 comet.shift(self.ledCount - len(comet))
 
             if self.effectRate == 0:
-                self.thisFrame.append(comet[0 : self.ledCount])
+                self.thisFrame = stripFrames(
+                    comet, self.ledCount, precision=self.precision
+                )
             else:
-                for i in range(len(comet)):
-                    comet.shift(
-                        int(self.effectRate + (self.effectRate < 1)), self.direction
-                    )
-                    self.thisFrame.append(comet[: self.ledCount])
-
-                    for x in range(int((1 / self.effectRate) - (self.effectRate <= 1))):
-                        self.thisFrame.append(comet[: self.ledCount])
+                step = int(self.effectRate + (self.effectRate < 1))
+                step = -step if self.direction else step
+                repeat = 1 + max(0, int((1 / self.effectRate) - (self.effectRate <= 1)))
+                self.thisFrame = stripFrames(
+                    comet,
+                    self.ledCount,
+                    frameCount=len(comet) * repeat,
+                    start=step,
+                    step=step,
+                    repeat=repeat,
+                    precision=self.precision,
+                )
 
-            self.frameCount = len(self.thisFrame)
+            return self.thisFrame
 
     # Lights move sequentially with decay
     class layerChase(_layerBase):
@@ -937,6 +2417,9 @@ class ledEffect:
             if len(self.paletteColors) == 1:
                 self.paletteColors += colorArray(COLORS, COLORS * [0])
 
+            self._shareFrames()
+
+        def _buildFrames(self):
             decayTable = self._decayTable(
                 factor=len(self.paletteColors) * self.effectCutoff, rate=1
             )
@@ -958,18 +2441,24 @@ class ledEffect:
             if self.direction:
                 chase.reverse()
             if self.effectRate == 0:
-                self.thisFrame.append(chase[0 : self.ledCount])
+                self.thisFrame = stripFrames(
+                    chase, self.ledCount, precision=self.precision
+                )
             else:
-                for _ in range(len(chase)):
-                    chase.shift(
-                        int(self.effectRate + (self.effectRate < 1)), self.direction
-                    )
-                    self.thisFrame.append(chase[0 : self.ledCount])
-
-                    for _ in range(int((1 / self.effectRate) - (self.effectRate <= 1))):
-                        self.thisFrame.append(chase[0 : self.ledCount])
+                step = int(self.effectRate + (self.effectRate < 1))
+                step = -step if self.direction else step
+                repeat = 1 + max(0, int((1 / self.effectRate) - (self.effectRate <= 1)))
+                self.thisFrame = stripFrames(
+                    chase,
+                    self.ledCount,
+                    frameCount=len(chase) * repeat,
+                    start=step,
+                    step=step,
+                    repeat=repeat,
+                    precision=self.precision,
+                )
 
-            self.frameCount = len(self.thisFrame)
+            return self.thisFrame
 
     #Cylon, single LED bounces from start to end of strip
     class layerCylon(_layerBase):
@@ -980,36 +2469,41 @@ class ledEffect:
 
             if self.effectRate <= 0:
                 raise Exception("effect rate for cylon must be > 0")
+            if int(self.effectRate / self.frameRate) == 1:
+                raise Exception("effect rate for cylon must span at least 2 frames")
+
+            self._shareFrames()
 
+        def _buildFrames(self):
             # How many frames per sweep animation.
             frames = int(self.effectRate / self.frameRate)
 
-            direction = True
-
-            for _ in range(len(self.paletteColors) % 2 + 1):
-                for c in range(0, len(self.paletteColors)):
-                    color = self.paletteColors[c]
-
-                    for frame in range(frames):
-                        pct = frame / (frames - 1)
-                        newFrame = []
-
-                        p = int(round((self.ledCount - 2) * pct) if direction else 1 + round(((self.ledCount - 2) * (1 - pct))))
+            palette = self.paletteColors
+            ledCount = self.ledCount
+            self.thisFrame = pointFrames(ledCount, palette)
 
-                        for i in range(self.ledCount):
-                            newFrame += color if p == i else [0.0] * COLORS
+            # every sweep shows the next color and reverses the direction
+            for sweep in range((len(palette) % 2 + 1) * len(palette)):
+                for frame in range(frames):
+                    pct = frame / (frames - 1)
 
-                        self.thisFrame.append(newFrame)
+                    if sweep % 2 == 0:
+                        p = int(round((ledCount - 2) * pct))
+                    else:
+                        p = int(1 + round((ledCount - 2) * (1 - pct)))
 
-                    direction = not direction
+                    self.thisFrame.append(p, sweep % len(palette))
 
-            self.frameCount = len(self.thisFrame)
+            return self.thisFrame
 
     #Color gradient over all LEDs
     class layerGradient(_layerBase):
         def __init__(self, **kwargs):
             super(ledEffect.layerGradient, self).__init__(**kwargs)
 
+            self._shareFrames()
+
+        def _buildFrames(self):
             direction = -1 if self.effectRate < 0 else 1
 
             if self.effectRate == 0:
@@ -1020,64 +2514,76 @@ class ledEffect:
                 COLORS, self._gradient(self.paletteColors, gradientLength, toFirst=True)
             )
 
-            for i in range(gradientLength if self.effectRate != 0 else 1):
-                frame = colorArray(COLORS, ([0.0] * COLORS) * self.ledCount)
-                for led in range(self.ledCount):
-                    frame[led] = gradient[
-                        int(
-                            i * direction
-                            + self.effectCutoff * gradientLength * led / self.ledCount
-                        )
-                        % gradientLength
-                    ]
-                self.thisFrame.append(frame)
+            self.thisFrame = stripFrames(
+                gradient,
+                self.ledCount,
+                frameCount=gradientLength if self.effectRate != 0 else 1,
+                step=direction,
+                positions=[
+                    self.effectCutoff * gradientLength * led / self.ledCount
+                    for led in range(self.ledCount)
+                ],
+                precision=self.precision,
+            )
 
-            self.frameCount = len(self.thisFrame)
+            return self.thisFrame
 
     class layerPattern(_layerBase):
         def __init__(self, **kwargs):
             super(ledEffect.layerPattern, self).__init__(**kwargs)
 
+            self._shareFrames()
+
+        def _buildFrames(self):
             self.paletteColors = colorArray(COLORS, self.paletteColors)
             frame = colorArray(COLORS, [])
 
             for i in range(int(self.ledCount / len(self.paletteColors)) + 1):
                 frame += self.paletteColors
 
-            if int(self.effectRate / self.frameRate) == 0:
-                self.thisFrame.append(frame)
+            repeat = int(self.effectRate / self.frameRate)
+            if repeat == 0:
+                self.thisFrame = stripFrames(
+                    frame, self.ledCount, precision=self.precision
+                )
             else:
-                for _ in range(len(self.paletteColors) * (self.ledCount - 1)):
-                    for _ in range(int(self.effectRate / self.frameRate)):
-                        self.thisFrame.append(
-                            colorArray(COLORS, frame)[: COLORS * self.ledCount]
-                        )
-                    frame.shift(int(self.effectCutoff))
+                self.thisFrame = stripFrames(
+                    frame,
+                    self.ledCount,
+                    frameCount=len(self.paletteColors) * (self.ledCount - 1) * repeat,
+                    step=-int(self.effectCutoff),
+                    repeat=repeat,
+                    precision=self.precision,
+                )
 
-            self.frameCount = len(self.thisFrame)
+            return self.thisFrame
 
     # Responds to heater temperature
     class layerHeater(_layerBase):
+        liveParameters = ("effectRate", "effectCutoff")
+
         def __init__(self, **kwargs):
             super(ledEffect.layerHeater, self).__init__(**kwargs)
 
             if len(self.paletteColors) == 1:
                 self.paletteColors += self.paletteColors
 
+            if self.handler.heater is None:
+                raise self.handler.printer.config_error(
+                    "LED Effect '%s' has no heater defined." % (self.handler.name)
+                )
+
+            self._shareFrames()
+
+        def _buildFrames(self):
             gradient = colorArray(
                 COLORS,
                 self._gradient(self.paletteColors[:-1], 200) + self.paletteColors[-1:],
             )
 
-            for i in range(len(gradient)):
-                self.thisFrame.append(gradient[i] * self.ledCount)
-
-            self.frameCount = len(self.thisFrame)
-
-            if self.handler.heater is None:
-                raise self.handler.printer.config_error(
-                    "LED Effect '%s' has no heater defined." % (self.handler.name)
-                )
+            return self._renderFrames(
+                lambda frame: gradient[frame], len(gradient), uniform=True
+            )
 
         def nextFrame(self, eventtime):
             heaterTarget = self.frameHandler.heaterTarget[self.handler.heater]
@@ -1092,7 +2598,7 @@ class ledEffect:
 
             if heaterTarget > 0.0:
                 if heaterTarget - acceptance_offset <= threshold_temperature:
-                    return self.thisFrame[-1]
+                    return self._frameAt(-1)
                 elif heaterCurrent <= heaterTarget - acceptance_offset:
                     shrunken_current = heaterCurrent - threshold_temperature
                     shrunken_target = (
@@ -1100,42 +2606,48 @@ class ledEffect:
                     )
                     s = int((shrunken_current / shrunken_target) * 200)
                     s = min(len(self.thisFrame) - 1, s)
-                    return self.thisFrame[s]
+                    return self._frameAt(s)
                 elif self.effectCutoff > 0:
                     return None
                 else:
-                    return self.thisFrame[-1]
+                    return self._frameAt(-1)
 
             elif heaterLast > 0.0:
                 if heaterLast - acceptance_offset <= threshold_temperature:
-                    return self.thisFrame[-1]
+                    return self._frameAt(-1)
                 else:
                     shrunken_current = heaterCurrent - threshold_temperature
                     shrunken_last = heaterLast - threshold_temperature
                     s = int((shrunken_current / shrunken_last) * 200)
                     s = min(len(self.thisFrame) - 1, s)
-                    return self.thisFrame[s]
+                    return self._frameAt(s)
 
             return None
 
     # Responds to heater temperature
     class layerTemperature(_layerBase):
+        liveParameters = ("effectRate", "effectCutoff")
+
         def __init__(self, **kwargs):
             super(ledEffect.layerTemperature, self).__init__(**kwargs)
             if len(self.paletteColors) == 1:
                 self.paletteColors = (
                     colorArray(COLORS, ([0.0] * COLORS)) + self.paletteColors
                 )
-            gradient = colorArray(COLORS, self._gradient(self.paletteColors, 200))
-            for i in range(len(gradient)):
-                self.thisFrame.append(gradient[i] * self.ledCount)
-            self.frameCount = len(self.thisFrame)
-
             if self.handler.heater is None:
                 raise self.handler.printer.config_error(
                     "LED Effect '%s' has no heater defined." % (self.handler.name)
                 )
 
+            self._shareFrames()
+
+        def _buildFrames(self):
+            gradient = colorArray(COLORS, self._gradient(self.paletteColors, 200))
+
+            return self._renderFrames(
+                lambda frame: gradient[frame], len(gradient), uniform=True
+            )
+
         def nextFrame(self, eventtime):
             if self.effectCutoff == self.effectRate:
                 s = (
@@ -1158,7 +2670,7 @@ class ledEffect:
 
             s = min(len(self.thisFrame) - 1, s)
             s = max(0, s)
-            return self.thisFrame[s]
+            return self._frameAt(s)
 
     class layerHeaterGauge(_layerBase):
         def __init__(self, **kwargs):
@@ -1170,6 +2682,9 @@ class ledEffect:
             if self.effectCutoff < 0:
                 self.effectCutoff = self.ledCount
 
+            self._shareFrames()
+
+        def _buildFrames(self):
             if self.effectRate == 0:
                 trailing = colorArray(COLORS, [0.0] * COLORS * self.ledCount)
             else:
@@ -1191,19 +2706,17 @@ class ledEffect:
                 leading.padRight([0.0] * COLORS, self.ledCount)
 
             gradient = colorArray(COLORS, trailing + self.paletteColors[0] + leading)
-            gradient.shift(len(trailing), 0)
-            frames = [gradient[: self.ledCount]]
-
-            for i in range(0, self.ledCount):
-                gradient.shift(1, 1)
-                frames.append(gradient[: self.ledCount])
 
-            self.thisFrame.append(colorArray(COLORS, [0.0] * COLORS * self.ledCount))
+            # the first frame is the dark start of the trailing part
+            offsets = [0]
             for i in range(1, 101):
                 x = int((i / 101.0) * self.ledCount)
-                self.thisFrame.append(frames[x])
+                offsets.append(len(trailing) - x)
+            self.thisFrame = stripFrames(
+                gradient, self.ledCount, offsets=offsets, precision=self.precision
+            )
 
-            self.frameCount = len(self.thisFrame)
+            return self.thisFrame
 
         def nextFrame(self, eventtime):
             heaterTarget = self.frameHandler.heaterTarget[self.handler.heater]
@@ -1220,12 +2733,22 @@ class ledEffect:
             p = min(len(self.thisFrame) - 1, p)
             p = max(0, p)
 
-            return self.thisFrame[p]
+            return self._frameAt(p)
 
     class layerTemperatureGauge(_layerBase):
+        liveParameters = ("effectRate", "effectCutoff")
+
         def __init__(self, **kwargs):
             super(ledEffect.layerTemperatureGauge, self).__init__(**kwargs)
 
+            self.steps = 255
+            # the dimmed copy of the last frame, kept while the step is equal
+            self.dimmedSource = None
+            self.dimmedFrame = None
+
+            self._shareFrames()
+
+        def _buildFrames(self):
             trailing = colorArray(
                 COLORS, self._gradient(self.paletteColors[1:], int(self.ledCount), True)
             )
@@ -1234,34 +2757,17 @@ class ledEffect:
             leading = colorArray(COLORS, [0.0] * COLORS * self.ledCount)
 
             gradient = colorArray(COLORS, trailing + self.paletteColors[0] + leading)
-            gradient.shift(len(trailing), 0)
-            frames = [gradient[: self.ledCount]]
-
-            for i in range(0, self.ledCount):
-                gradient.shift(1, 1)
-                frames.append(gradient[: self.ledCount])
 
-            self.thisFrame.append(colorArray(COLORS, [0.0] * COLORS * self.ledCount))
-            self.steps = 255
+            # the first frame is the dark start of the trailing part
+            offsets = [0]
             for i in range(1, self.steps + 1):
                 x = int((i / float(self.steps + 1)) * self.ledCount)
-                frames2 = colorArray(COLORS, [])
-
-                for idx, led in enumerate(frames[x]):
-                    brightness = min(
-                        1.0,
-                        max(
-                            0.0,
-                            len(frames[x]) * (float(i) / float(self.steps + 1))
-                            - int(idx / COLORS),
-                        ),
-                    )
-
-                    frames2.append(led * brightness)
-
-                self.thisFrame.append(frames2)
+                offsets.append(len(trailing) - x)
+            self.thisFrame = stripFrames(
+                gradient, self.ledCount, offsets=offsets, precision=self.precision
+            )
 
-            self.frameCount = len(self.thisFrame)
+            return self.thisFrame
 
         def nextFrame(self, eventtime):
             if self.effectCutoff == self.effectRate:
@@ -1286,31 +2792,58 @@ class ledEffect:
             s = min(len(self.thisFrame) - 1, s)
             s = max(0, s)
 
-            return self.thisFrame[s]
+            frame = self._frameAt(s)
+            if s > 0:
+                if frame is not self.dimmedSource:
+                    # dim the leading LED by the fraction of the step it covers
+                    x = int((s / float(self.steps + 1)) * self.ledCount)
+                    brightness = min(
+                        1.0,
+                        max(
+                            0.0, self.ledCount * (float(s) / float(self.steps + 1)) - x
+                        ),
+                    )
+                    self.dimmedSource = frame
+                    self.dimmedFrame = list(frame)
+                    for c in range(x * COLORS, x * COLORS + COLORS):
+                        self.dimmedFrame[c] *= brightness
+                frame = self.dimmedFrame
+
+            return frame
 
     # Responds to analog pin voltage
     class layerAnalogPin(_layerBase):
+        liveParameters = ("effectRate", "effectCutoff")
+
         def __init__(self, **kwargs):
             super(ledEffect.layerAnalogPin, self).__init__(**kwargs)
 
             if len(self.paletteColors) == 1:
                 self.paletteColors = [0.0] * COLORS + self.paletteColors
 
+            self._shareFrames()
+
+        def _buildFrames(self):
             gradient = colorArray(COLORS, self._gradient(self.paletteColors, 101))
 
-            for i in range(len(gradient)):
-                self.thisFrame.append(gradient[i] * self.ledCount)
+            return self._renderFrames(
+                lambda frame: gradient[frame], len(gradient), uniform=True
+            )
 
-        def nextFrame(self, eventtime):
-            v = int(self.handler.analogValue * self.effectRate)
+        # index of the frame shown for an analog value
+        def frameIndex(self, analogValue):
+            v = int(analogValue * self.effectRate)
 
             if v > 100:
                 v = 100
 
             if v > self.effectCutoff:
-                return self.thisFrame[v]
+                return v
             else:
-                return self.thisFrame[0]
+                return 0
+
+        def nextFrame(self, eventtime):
+            return self._frameAt(self.frameIndex(self.handler.analogValue))
 
     # Lights illuminate relative to stepper position
     class layerStepper(_layerBase):
@@ -1323,6 +2856,9 @@ class ledEffect:
             if self.effectCutoff < 0:
                 self.effectCutoff = self.ledCount
 
+            self._shareFrames()
+
+        def _buildFrames(self):
             if self.effectRate == 0:
                 trailing = colorArray(COLORS, [0.0] * COLORS * self.ledCount)
             else:
@@ -1344,18 +2880,16 @@ class ledEffect:
                 leading.padRight([0.0] * COLORS, self.ledCount)
 
             gradient = colorArray(COLORS, trailing + self.paletteColors[0] + leading)
-            gradient.shift(len(trailing) - 1, 0)
-            frames = [gradient[: self.ledCount]]
-
-            for i in range(0, self.ledCount):
-                gradient.shift(1, 1)
-                frames.append(gradient[: self.ledCount])
 
+            offsets = []
             for i in range(101):
                 x = int((i / 101.0) * self.ledCount)
-                self.thisFrame.append(frames[x])
+                offsets.append(len(trailing) - 1 - x)
+            self.thisFrame = stripFrames(
+                gradient, self.ledCount, offsets=offsets, precision=self.precision
+            )
 
-            self.frameCount = len(self.thisFrame)
+            return self.thisFrame
 
         def nextFrame(self, eventtime):
             if self.handler.stepper == "x":
@@ -1371,19 +2905,25 @@ class ledEffect:
                 p = 0
             if p > 100:
                 p = 100
-            return self.thisFrame[int((p - 1) * (p > 0))]
+            return self._frameAt(int((p - 1) * (p > 0)))
 
     class layerStepperColor(_layerBase):
+        liveParameters = ("effectRate", "effectCutoff")
+
         def __init__(self, **kwargs):
             super(ledEffect.layerStepperColor, self).__init__(**kwargs)
 
             if len(self.paletteColors) == 1:
                 self.paletteColors = [0.0] * COLORS + self.paletteColors
 
+            self._shareFrames()
+
+        def _buildFrames(self):
             gradient = colorArray(COLORS, self._gradient(self.paletteColors, 101))
 
-            for i in range(len(gradient)):
-                self.thisFrame.append(gradient[i] * self.ledCount)
+            return self._renderFrames(
+                lambda frame: gradient[frame], len(gradient), uniform=True
+            )
 
         def nextFrame(self, eventtime):
             if self.handler.stepper == "x":
@@ -1403,60 +2943,59 @@ class ledEffect:
             if p > 100:
                 p = 100
 
-            return self.thisFrame[int(p)]
+            return self._frameAt(int(p))
 
     # Shameless port of Fire2012 by Mark Kriegsman
 
     # Shamelessly appropriated from the Arduino FastLED example files
     # Fire2012.ino by Daniel Garcia
     class layerFire(_layerBase):
+        liveParameters = ("effectCutoff",)
+
         def __init__(self, **kwargs):
             super(ledEffect.layerFire, self).__init__(**kwargs)
 
-            self.heatMap = [0.0] * self.ledCount
             self.gradient = colorArray(COLORS, self._gradient(self.paletteColors, 102))
             self.frameLen = len(self.gradient)
-            self.heatLen = len(self.heatMap)
+            self.heatLen = self.ledCount
             self.heatSource = int(self.ledCount / 10.0)
             self.effectRate = int(self.effectRate)
 
             if self.heatSource < 1:
                 self.heatSource = 1
 
-        def nextFrame(self, eventtime):
-            frame = []
-
-            for h in range(self.heatLen):
-                c = randint(0, self.effectCutoff)
-                self.heatMap[h] -= (self.heatMap[h] - c >= 0) * c
+            kernel = fireNumpyKernel if numpy is not None else fireKernel
+            self.fire = kernel(
+                self.ledCount, self.heatSource, self.gradient, self.precision
+            )
+            self.lastFire = None
 
-            for i in range(self.ledCount - 1, self.heatSource, -1):
-                d = (
-                    self.heatMap[i - 1] + self.heatMap[i - 2] + self.heatMap[i - 3]
-                ) / 3
+        def nextFrame(self, eventtime):
+            frames = self._elapsedFrames(eventtime)
+            if not frames and self.lastFire is not None:
+                return self.lastFire
 
-                self.heatMap[i] = d * (d >= 0)
+            # after a long stall, one second of simulation is enough
+            for _ in range(min(frames, int(1.0 / self.frameRate))):
+                self.fire.cool(self.effectCutoff)
+                self.fire.diffuse()
 
-            if randint(0, 100) < self.effectRate:
-                h = randint(0, self.heatSource)
-                self.heatMap[h] += randint(90, 100)
-                if self.heatMap[h] > 100:
-                    self.heatMap[h] = 100
+                if randint(0, 100) < self.effectRate:
+                    self.fire.ignite(randint(0, self.heatSource), randint(90, 100))
 
-            for h in self.heatMap:
-                frame += self.gradient[int(h)]
-
-            return frame
+            self.lastFire = self.fire.frame()
+            return self.lastFire
 
     # Fire that responds relative to actual vs target temp
     class layerHeaterFire(_layerBase):
+        liveParameters = ("effectRate", "effectCutoff")
+
         def __init__(self, **kwargs):
             super(ledEffect.layerHeaterFire, self).__init__(**kwargs)
 
-            self.heatMap = [0.0] * self.ledCount
             self.gradient = colorArray(COLORS, self._gradient(self.paletteColors, 102))
             self.frameLen = len(self.gradient)
-            self.heatLen = len(self.heatMap)
+            self.heatLen = self.ledCount
             self.heatSource = int(self.ledCount / 10.0)
 
             if self.handler.heater is None:
@@ -1467,8 +3006,13 @@ class ledEffect:
             if self.heatSource < 1:
                 self.heatSource = 1
 
+            kernel = fireNumpyKernel if numpy is not None else fireKernel
+            self.fire = kernel(
+                self.ledCount, self.heatSource, self.gradient, self.precision
+            )
+            self.lastFire = None
+
         def nextFrame(self, eventtime):
-            frame = []
             spark = 0
             heaterTarget = self.frameHandler.heaterTarget[self.handler.heater]
             heaterCurrent = self.frameHandler.heaterCurrent[self.handler.heater]
@@ -1491,32 +3035,24 @@ class ledEffect:
                         ((heaterCurrent - self.effectRate) / heaterLast) * 100
                     )
 
+            frames = self._elapsedFrames(eventtime)
             if spark > 0 and heaterTarget != 0:
-                cooling = int((heaterCurrent / heaterTarget) * 20)
+                if not frames and self.lastFire is not None:
+                    return self.lastFire
 
-                for h in range(self.heatLen):
-                    c = randint(0, cooling)
-                    self.heatMap[h] -= (self.heatMap[h] - c >= 0) * c
+                # after a long stall, one second of simulation is enough
+                for _ in range(min(frames, int(1.0 / self.frameRate))):
+                    self.fire.cool(int((heaterCurrent / heaterTarget) * 20))
+                    self.fire.diffuse()
 
-                for i in range(self.ledCount - 1, self.heatSource, -1):
-                    d = (
-                        self.heatMap[i - 1] + self.heatMap[i - 2] + self.heatMap[i - 3]
-                    ) / 3
+                    if randint(0, 100) < spark:
+                        self.fire.ignite(randint(0, self.heatSource), brightness)
 
-                    self.heatMap[i] = d * (d >= 0)
-
-                if randint(0, 100) < spark:
-                    h = randint(0, self.heatSource)
-                    self.heatMap[h] += brightness
-                    if self.heatMap[h] > 100:
-                        self.heatMap[h] = 100
-
-                for h in self.heatMap:
-                    frame += self.gradient[int(h)]
-
-                return frame
+                self.lastFire = self.fire.frame()
+                return self.lastFire
 
             else:
+                self.lastFire = None
                 return None
 
     # Progress bar using M73 gcode command
@@ -1530,6 +3066,9 @@ class ledEffect:
             if self.effectCutoff < 0:
                 self.effectCutoff = self.ledCount
 
+            self._shareFrames()
+
+        def _buildFrames(self):
             if self.effectRate == 0:
                 trailing = colorArray(COLORS, [0.0] * COLORS * self.ledCount)
             else:
@@ -1551,23 +3090,21 @@ class ledEffect:
                 leading.padRight([0.0] * COLORS, self.ledCount)
 
             gradient = colorArray(COLORS, trailing + self.paletteColors[0] + leading)
-            gradient.shift(len(trailing), 0)
-            frames = [gradient[: self.ledCount]]
-
-            for i in range(0, self.ledCount):
-                gradient.shift(1, 1)
-                frames.append(gradient[: self.ledCount])
 
-            self.thisFrame.append(colorArray(COLORS, [0.0] * COLORS * self.ledCount))
+            # the first frame is the dark start of the trailing part
+            offsets = [0]
             for i in range(1, 101):
                 x = int((i / 101.0) * self.ledCount)
-                self.thisFrame.append(frames[x])
+                offsets.append(len(trailing) - x)
+            self.thisFrame = stripFrames(
+                gradient, self.ledCount, offsets=offsets, precision=self.precision
+            )
 
-            self.frameCount = len(self.thisFrame)
+            return self.thisFrame
 
         def nextFrame(self, eventtime):
             p = self.frameHandler.printProgress
-            return self.thisFrame[p]  # (p - 1) * (p > 0)]
+            return self._frameAt(p)  # (p - 1) * (p > 0)]
 
     class layerHoming(_layerBase):
         def __init__(self, **kwargs):
@@ -1575,39 +3112,44 @@ class ledEffect:
 
             self.paletteColors = colorArray(COLORS, self.paletteColors)
 
-            gradientLength = int(self.ledCount)
-            gradient = colorArray(
-                COLORS, self._gradient(self.paletteColors, gradientLength)
-            )
-
-            for c in range(0, len(self.paletteColors)):
-                color = self.paletteColors[c]
-                self.thisFrame.append(colorArray(COLORS, color * self.ledCount))
+            self._shareFrames()
 
             self.decayTable = self._decayTable(factor=self.effectRate)
             self.decayTable.append(0.0)
             self.decayLen = len(self.decayTable)
             self.counter = self.decayLen - 1
+            # the decay follows the time since the end of the homing move
+            self.decayStart = None
             self.coloridx = -1
             self.my_flag = {}
             for endstop in self.handler.endstops:
                 self.frameHandler.homing_end_flag[endstop] = 0
                 self.my_flag[endstop] = self.frameHandler.homing_end_flag[endstop]
 
+        def _buildFrames(self):
+            palette = self.paletteColors
+
+            return self._renderFrames(
+                lambda frame: palette[frame], len(palette), uniform=True
+            )
+
         def nextFrame(self, eventtime):
             for endstop in self.handler.endstops:
                 if self.my_flag[endstop] != self.frameHandler.homing_end_flag[endstop]:
-                    self.counter = 0
+                    self.decayStart = eventtime
                     self.coloridx = (self.coloridx + 1) % len(self.paletteColors)
                     self.my_flag[endstop] = self.frameHandler.homing_end_flag[endstop]
 
-            frame = [
-                self.decayTable[self.counter] * i for i in self.thisFrame[self.coloridx]
-            ]
-            if self.counter < self.decayLen - 1:
-                self.counter += 1
+            if self.decayStart is not None:
+                self.counter = min(
+                    int((eventtime - self.decayStart) / self.frameRate + 0.5),
+                    self.decayLen - 1,
+                )
 
-            return frame
+            b = self.decayTable[self.counter]
+            return self._uniformFrame(
+                [b * i for i in self.thisFrame[self.coloridx].color]
+            )
 
     class layerSwitchButton(_layerBase):
         def __init__(self, **kwargs):
@@ -1617,11 +3159,17 @@ class ledEffect:
             self.fadeValue = 0.0
             self.paletteColors = colorArray(COLORS, self.paletteColors)
 
-            for c in range(0, len(self.paletteColors)):
-                color = self.paletteColors[c]
-                self.thisFrame.append(colorArray(COLORS, color * self.ledCount))
+            self._shareFrames()
+
+        def _buildFrames(self):
+            palette = self.paletteColors
+
+            return self._renderFrames(
+                lambda frame: palette[frame], len(palette), uniform=True
+            )
 
         def nextFrame(self, eventtime):
+            elapsed = self._elapsedTime(eventtime)
             if self.handler.button_state > self.last_state:
                 self.coloridx = (self.coloridx + 1) % len(self.paletteColors)
 
@@ -1629,12 +3177,12 @@ class ledEffect:
 
             if self.last_state:
                 if self.effectRate > 0 and self.fadeValue < 1.0:
-                    self.fadeValue += self.handler.frameRate / self.effectRate
+                    self.fadeValue += elapsed / self.effectRate
                 else:
                     self.fadeValue = 1.0
             else:
                 if self.effectCutoff > 0 and self.fadeValue > 0.0:
-                    self.fadeValue -= self.handler.frameRate / self.effectCutoff
+                    self.fadeValue -= elapsed / self.effectCutoff
                 else:
                     self.fadeValue = 0.0
 
@@ -1642,7 +3190,9 @@ class ledEffect:
                 self.fadeValue = 0
             if self.fadeValue > 1.0:
                 self.fadeValue = 1.0
-            return [self.fadeValue * i for i in self.thisFrame[self.coloridx]]
+            return self._uniformFrame(
+                [self.fadeValue * i for i in self.thisFrame[self.coloridx].color]
+            )
 
     class layerToggleButton(_layerBase):
         def __init__(self, **kwargs):
@@ -1655,11 +3205,17 @@ class ledEffect:
             self.active = False
             self.paletteColors = colorArray(COLORS, self.paletteColors)
 
-            for c in range(0, len(self.paletteColors)):
-                color = self.paletteColors[c]
-                self.thisFrame.append(colorArray(COLORS, color * self.ledCount))
+            self._shareFrames()
+
+        def _buildFrames(self):
+            palette = self.paletteColors
+
+            return self._renderFrames(
+                lambda frame: palette[frame], len(palette), uniform=True
+            )
 
         def nextFrame(self, eventtime):
+            elapsed = self._elapsedTime(eventtime)
             if self.handler.button_state > self.last_state:
                 self.last_coloridx = self.coloridx
                 self.coloridx = (self.coloridx + 1) % len(self.paletteColors)
@@ -1670,11 +3226,11 @@ class ledEffect:
             self.last_state = self.handler.button_state
 
             if self.effectRate > 0 and self.fadeInValue < 1.0:
-                self.fadeInValue += self.handler.frameRate / self.effectRate
+                self.fadeInValue += elapsed / self.effectRate
             else:
                 self.fadeInValue = 1.0
             if self.effectCutoff > 0 and self.fadeOutValue > 0.0:
-                self.fadeOutValue -= self.handler.frameRate / self.effectCutoff
+                self.fadeOutValue -= elapsed / self.effectCutoff
             else:
                 self.fadeOutValue = 0.0
 
@@ -1688,12 +3244,15 @@ class ledEffect:
             if self.fadeOutValue > 1.0:
                 self.fadeOutValue = 1.0
 
-            frameIn = [self.fadeInValue * i for i in self.thisFrame[self.coloridx]]
-            frameOut = [
-                self.fadeOutValue * i for i in self.thisFrame[self.last_coloridx]
-            ]
+            colorIn = self.thisFrame[self.coloridx].color
+            colorOut = self.thisFrame[self.last_coloridx].color
 
-            return [i + o for i, o in zip(frameIn, frameOut)]
+            return self._uniformFrame(
+                [
+                    self.fadeInValue * i + self.fadeOutValue * o
+                    for i, o in zip(colorIn, colorOut)
+                ]
+            )
 
     class layerFlashButton(_layerBase):
         def __init__(self, **kwargs):
@@ -1704,11 +3263,17 @@ class ledEffect:
             self.fadeValue = 0.0
             self.paletteColors = colorArray(COLORS, self.paletteColors)
 
-            for c in range(0, len(self.paletteColors)):
-                color = self.paletteColors[c]
-                self.thisFrame.append(colorArray(COLORS, color * self.ledCount))
+            self._shareFrames()
+
+        def _buildFrames(self):
+            palette = self.paletteColors
+
+            return self._renderFrames(
+                lambda frame: palette[frame], len(palette), uniform=True
+            )
 
         def nextFrame(self, eventtime):
+            elapsed = self._elapsedTime(eventtime)
             if self.handler.button_state > self.last_state:
                 self.coloridx = (self.coloridx + 1) % len(self.paletteColors)
                 self.active = True
@@ -1717,7 +3282,7 @@ class ledEffect:
 
             if self.active:
                 if self.effectRate > 0 and self.fadeValue < 1.0:
-                    self.fadeValue += self.handler.frameRate / self.effectRate
+                    self.fadeValue += elapsed / self.effectRate
                 else:
                     self.fadeValue = 1.0
                 if self.fadeValue >= 1.0:
@@ -1725,14 +3290,16 @@ class ledEffect:
                     self.active = False
             else:
                 if self.effectCutoff > 0 and self.fadeValue > 0.0:
-                    self.fadeValue -= self.handler.frameRate / self.effectCutoff
+                    self.fadeValue -= elapsed / self.effectCutoff
                 else:
                     self.fadeValue = 0.0
 
             if self.fadeValue <= 0:
                 self.fadeValue = 0
 
-            return [self.fadeValue * i for i in self.thisFrame[self.coloridx]]
+            return self._uniformFrame(
+                [self.fadeValue * i for i in self.thisFrame[self.coloridx].color]
+            )
 
 
 def load_config_prefix(config):